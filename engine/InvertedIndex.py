@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+VEC_TYPES = ["TFIDFVector", "TFIDFFieldVector", "BM25plusVector", "BM25plusFieldVector"]
+WORD_TYPES = ["original", "stemmed", "lemmatized"]
+
+
+class InvertedIndex:
+    """Term to postings mapping for every vector type and word type, built from the document vector weights"""
+
+    def __init__(self, document_vectors, combinations: Iterable[Tuple[str, str]] = None):
+        """Indexes the given (vec_type, word_type) combinations of the vectors, all of them by default"""
+        self.postings: Dict[str, Dict[str, Dict[str, List[Tuple[int, float]]]]] = {
+            vec_type: {word_type: {} for word_type in WORD_TYPES} for vec_type in VEC_TYPES
+        }
+        self.upper_bounds: Dict[str, Dict[str, Dict[str, float]]] = {
+            vec_type: {word_type: {} for word_type in WORD_TYPES} for vec_type in VEC_TYPES
+        }
+        self.impact_ordered: Dict[Tuple[str, str], Dict[str, List[Tuple[int, float]]]] = {}
+        self.number_of_documents = len(document_vectors)
+        if combinations is None:
+            combinations = [(vec_type, word_type) for vec_type in VEC_TYPES for word_type in WORD_TYPES]
+        for vec_type, word_type in combinations:
+            self.add_combination(vec_type, word_type, (
+                (index, vector_store.__getattribute__(vec_type).__getattribute__(f"{word_type}_data").value)
+                for index, vector_store in enumerate(document_vectors) if vector_store is not None))
+
+    def add_combination(self, vec_type: str, word_type: str,
+                        document_weights: Iterable[Tuple[int, Dict[str, float]]]) -> None:
+        """
+        Indexes one combination from (document index, word weights) pairs in document order, so postings are ordered
+        by document, replacing whatever was indexed for it before
+        """
+        self._check_types(vec_type, word_type)
+        postings = {}
+        for index, weights in document_weights:
+            for word, weight in weights.items():
+                postings.setdefault(word, []).append((index, weight))
+        self.postings[vec_type][word_type] = postings
+        # Largest weight in each postings list, the most a term can add to any document score
+        self.upper_bounds[vec_type][word_type] = {word: max(weight for _, weight in word_postings)
+                                                  for word, word_postings in postings.items()}
+        self.impact_ordered.pop((vec_type, word_type), None)
+
+    def get_postings(self, vec_type: str, word_type: str, word: str) -> List[Tuple[int, float]]:
+        """Postings for a word, empty if no document holds it"""
+        self._check_types(vec_type, word_type)
+        return self.postings[vec_type][word_type].get(word, [])
+
+    def get_impact_postings(self, vec_type: str, word_type: str, word: str) -> List[Tuple[int, float]]:
+        """Postings sorted by descending weight, laid out for a combination the first time it is asked for"""
+        if (vec_type, word_type) not in self.impact_ordered:
+            self._check_types(vec_type, word_type)
+            self.impact_ordered[(vec_type, word_type)] = {
+                term: sorted(postings, key=lambda posting: (-posting[1], posting[0]))
+                for term, postings in self.postings[vec_type][word_type].items()
+            }
+        return self.impact_ordered[(vec_type, word_type)].get(word, [])
+
+    @staticmethod
+    def _check_types(vec_type: str, word_type: str) -> None:
+        if vec_type not in VEC_TYPES or word_type not in WORD_TYPES:
+            raise ValueError(f"Invalid vector type {vec_type} or word type {word_type}")
+
+    def get_upper_bound(self, vec_type: str, word_type: str, word: str) -> float:
+        return self.upper_bounds[vec_type][word_type].get(word, 0)
+
+    def document_frequency(self, vec_type: str, word_type: str, word: str) -> int:
+        return len(self.get_postings(vec_type, word_type, word))
+
+
+class MappedInvertedIndex(InvertedIndex):
+    """Postings served from a memory mapped index file, each term's list is decoded the first time it is asked for"""
+
+    def __init__(self, mapped_index: "MappedIndex"):
+        self.mapped_index = mapped_index
+        self.postings = {vec_type: {word_type: {} for word_type in WORD_TYPES} for vec_type in VEC_TYPES}
+        self.upper_bounds = {vec_type: {word_type: {} for word_type in WORD_TYPES} for vec_type in VEC_TYPES}
+        self.impact_ordered = {}
+        self.number_of_documents = mapped_index.document_count
+        # Combinations the file does not hold, indexed in memory once they are built
+        self.in_memory: set[Tuple[str, str]] = set()
+
+    def add_combination(self, vec_type: str, word_type: str,
+                        document_weights: Iterable[Tuple[int, Dict[str, float]]]) -> None:
+        super().add_combination(vec_type, word_type, document_weights)
+        self.in_memory.add((vec_type, word_type))
+
+    def get_postings(self, vec_type: str, word_type: str, word: str) -> List[Tuple[int, float]]:
+        self._check_types(vec_type, word_type)
+        postings = self.postings[vec_type][word_type]
+        if (vec_type, word_type) in self.in_memory:
+            return postings.get(word, [])
+        if word not in postings:
+            postings[word] = self.mapped_index.get_postings(vec_type, word_type, word)
+        return postings[word]
+
+    def get_impact_postings(self, vec_type: str, word_type: str, word: str) -> List[Tuple[int, float]]:
+        impact_ordered = self.impact_ordered.setdefault((vec_type, word_type), {})
+        if word not in impact_ordered:
+            impact_ordered[word] = sorted(self.get_postings(vec_type, word_type, word),
+                                          key=lambda posting: (-posting[1], posting[0]))
+        return impact_ordered[word]
+
+    def get_upper_bound(self, vec_type: str, word_type: str, word: str) -> float:
+        if (vec_type, word_type) in self.in_memory:
+            return super().get_upper_bound(vec_type, word_type, word)
+        return self.mapped_index.get_upper_bound(vec_type, word_type, word)
@@ -0,0 +1,452 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from engine.InvertedIndex import VEC_TYPES, WORD_TYPES
+from engine.PostingsCodec import PostingsCodec, dequantize, get_codec, quantize, quantized_size, unpack_bit_blocks
+from utils.Persistence import replace_atomically
+
+MAGIC = b"SRCHIDX\0"
+FORMAT_VERSION = 3
+# Magic, format version, crc32 of everything after the header, offset and length of the table of contents
+HEADER = struct.Struct("<8sIIQQ")
+# Sections start on a cache line so every array view is aligned
+ALIGNMENT = 64
+METADATA_FIELDS = ["url", "esrb", "publisher", "genre", "developer"]
+
+
+class MappedIndex:
+    """
+    Read only view of the versioned binary index file. The file is a fixed header, flat little endian arrays and a
+    JSON table of contents naming each array's dtype, offset and length. The whole file is mapped once and every
+    section is a view into the mapping, so opening it reads only the header and table of contents and the pages are
+    shared with every other process that maps the same file.
+
+    Sections, per word type w and vector type v:
+        lexicon/w/offsets, lexicon/w/bytes          utf-8 words in term id order
+        statistics/doc_lengths                      length of every document
+        statistics/w/document_frequency             documents holding every term
+        documents/live, documents/<field>/...       deleted flags and metadata strings by document id
+        vectors/v/w/indptr, indices, data           document by term weights, one row per document
+        postings/v/w/indptr, indices, data          the same weights as term by document postings
+        postings/v/w/upper_bounds                   largest weight in each postings list
+    The vectors and postings sections are only written for the combinations of v and w named in the table of contents.
+
+    When the index is written with a codec, the postings are instead cut into blocks of block_size, each block holding
+    the gaps between its document ids encoded with the codec and its weights, quantized to weight_bits if given:
+        postings/v/w/indptr                         first posting of every term
+        postings/v/w/block_indptr                   first block of every term
+        postings/v/w/block_last, block_max          skip data, the last document and largest weight of every block
+        postings/v/w/doc_offsets, doc_bytes         encoded gaps of every block
+        postings/v/w/weight_bytes                   quantized or float64 weights of every block
+    Every block but a term's last holds block_size postings, so where a block's postings and weights start is worked
+    out from the indptrs rather than stored. A compressed index does not store the vectors sections either, a
+    document's row is read from the decoded postings of its combination.
+    """
+
+    def __init__(self, path: str, buffer: np.memmap, checksum: int, toc: dict):
+        self.path = path
+        self.buffer = buffer
+        self.checksum = checksum
+        self.toc = toc
+        self.sections: Dict[str, Tuple[str, int, int]] = toc["sections"]
+        self.number_of_documents: int = toc["number_of_documents"]
+        self.document_count: int = toc["document_count"]
+        self.avg_doc_length: float = toc["avg_doc_length"]
+        self.corpus_version: int = toc["corpus_version"]
+        self.codec: Optional[PostingsCodec] = get_codec(toc["codec"]) if toc["codec"] is not None else None
+        self.weight_bits: Optional[int] = toc["weight_bits"]
+        self.block_size: int = toc["block_size"]
+        self.combinations = {(vec_type, word_type) for vec_type, word_type in toc["combinations"]}
+        self.words: Dict[str, List[str]] = {}
+        self.term_ids: Dict[str, Dict[str, int]] = {}
+        self.layouts: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.rows: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def open(cls, path: str, verify: bool = False) -> "MappedIndex":
+        """Maps the index file, verify reads every page to check the checksum instead of trusting the header"""
+        with open(path, "rb") as file:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"{path} is not an index file")
+            magic, version, checksum, toc_offset, toc_length = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an index file")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path} has index format version {version}, expected {FORMAT_VERSION}")
+            file.seek(toc_offset)
+            toc = json.loads(file.read(toc_length).decode("utf-8"))
+        index = cls(path, np.memmap(path, dtype=np.uint8, mode="r"), checksum, toc)
+        if verify:
+            index.verify()
+        return index
+
+    @classmethod
+    def open_if_exists(cls, path: str) -> Optional["MappedIndex"]:
+        """None when there is no usable index file at path, e.g. one written in an older format"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls.open(path)
+        except (ValueError, OSError):
+            return None
+
+    def verify(self) -> None:
+        if zlib.crc32(self.buffer[HEADER.size:]) != self.checksum:
+            raise ValueError(f"{self.path} failed its checksum")
+
+    def matches(self, corpus) -> bool:
+        """Whether the index was written for this corpus, by its version, documents and vocabulary"""
+        return (self.corpus_version == corpus.version and self.document_count == len(corpus.documents)
+                and self.number_of_documents == corpus.word_manager.number_of_documents
+                and all(len(self.array(f"lexicon/{word_type}/offsets")) - 1
+                        == len(corpus.vector_space.get_term_ids(word_type)) for word_type in WORD_TYPES))
+
+    def has_combination(self, vec_type: str, word_type: str) -> bool:
+        """Whether the file holds the vectors and postings of a combination"""
+        return (vec_type, word_type) in self.combinations
+
+    def array(self, name: str) -> np.ndarray:
+        dtype, offset, count = self.sections[name]
+        dtype = np.dtype(dtype)
+        return self.buffer[offset:offset + count * dtype.itemsize].view(dtype)
+
+    def strings(self, name: str) -> List[str]:
+        offsets = self.array(f"{name}/offsets").tolist()
+        data = bytes(self.array(f"{name}/bytes"))
+        return [data[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def get_words(self, word_type: str) -> List[str]:
+        """Vocabulary in term id order, decoded the first time it is asked for"""
+        if word_type not in self.words:
+            self.words[word_type] = self.strings(f"lexicon/{word_type}")
+        return self.words[word_type]
+
+    def get_term_ids(self, word_type: str) -> Dict[str, int]:
+        if word_type not in self.term_ids:
+            self.term_ids[word_type] = {word: index for index, word in enumerate(self.get_words(word_type))}
+        return self.term_ids[word_type]
+
+    def get_metadata(self) -> List["DocumentMetaData"]:
+        from search_components.Document import DocumentMetaData
+        fields = [self.strings(f"documents/{field}") for field in METADATA_FIELDS]
+        return [DocumentMetaData(doc_id, *values) for doc_id, values in enumerate(zip(*fields))]
+
+    def is_live(self, doc_id: int) -> bool:
+        return bool(self.array("documents/live")[doc_id])
+
+    def get_document_weights(self, vec_type: str, word_type: str, doc_id: int) -> Dict[str, float]:
+        """Word to weight dictionary of one document, the row the vector store used to hold as a Vector"""
+        terms, weights = self.get_document_arrays(vec_type, word_type, doc_id)
+        words = self.get_words(word_type)
+        return {words[term]: weight for term, weight in zip(terms.tolist(), weights.tolist())}
+
+    def get_document_arrays(self, vec_type: str, word_type: str, doc_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Ascending term ids and weights of one document, views into the mapping unless the postings are compressed"""
+        indptr, indices, data = self._rows(vec_type, word_type)
+        start, end = indptr[doc_id], indptr[doc_id + 1]
+        return indices[start:end], data[start:end]
+
+    def _rows(self, vec_type: str, word_type: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Document by term arrays of a combination, transposed from its postings the first time they are compressed"""
+        if self.codec is None:
+            return self._sparse(f"vectors/{vec_type}/{word_type}")
+        if (vec_type, word_type) not in self.rows:
+            rows = self.get_matrix(vec_type, word_type).tocsr()
+            rows.sort_indices()
+            self.rows[(vec_type, word_type)] = rows.indptr, rows.indices.astype(np.int32), rows.data
+        return self.rows[(vec_type, word_type)]
+
+    def get_postings(self, vec_type: str, word_type: str, word: str) -> List[Tuple[int, float]] | "BlockPostings":
+        """
+        (document, weight) postings of a word ordered by document, empty if no document holds it. Compressed postings
+        are read through a BlockPostings, which only decodes the blocks that are looked at.
+        """
+        term = self.get_term_ids(word_type).get(word)
+        if term is None:
+            return []
+        if self.codec is not None:
+            return BlockPostings(self, f"postings/{vec_type}/{word_type}", term)
+        indptr, indices, data = self._sparse(f"postings/{vec_type}/{word_type}")
+        start, end = indptr[term], indptr[term + 1]
+        return list(zip(indices[start:end].tolist(), data[start:end].tolist()))
+
+    def get_upper_bound(self, vec_type: str, word_type: str, word: str) -> float:
+        term = self.get_term_ids(word_type).get(word)
+        if term is None:
+            return 0
+        return float(self.array(f"postings/{vec_type}/{word_type}/upper_bounds")[term])
+
+    def get_matrix(self, vec_type: str, word_type: str) -> "csc_matrix":
+        """Document by term matrix over the mapped postings, no weights are copied"""
+        from scipy.sparse import csc_matrix
+        if self.codec is not None:
+            indptr, indices, data = self._decode_postings(f"postings/{vec_type}/{word_type}")
+        else:
+            indptr, indices, data = self._sparse(f"postings/{vec_type}/{word_type}")
+        return csc_matrix((data, indices, indptr), shape=(self.document_count, len(indptr) - 1), copy=False)
+
+    def decode_block(self, name: str, block: int, previous: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Document ids and weights of one block, previous is the last document of the term's block before it"""
+        counts, weight_offsets = self._layout(name)
+        count = int(counts[block])
+        doc_offsets = self.array(f"{name}/doc_offsets")
+        gaps = self.codec.decode(self.array(f"{name}/doc_bytes")[doc_offsets[block]:doc_offsets[block + 1]], count)
+        documents = previous + np.cumsum(gaps, dtype=np.int64)
+        weight_bytes = self.array(f"{name}/weight_bytes")[weight_offsets[block]:weight_offsets[block + 1]]
+        if self.weight_bits is None:
+            weights = weight_bytes.view("<f8")
+        else:
+            weights = dequantize(weight_bytes, count, float(self.array(f"{name}/block_max")[block]), self.weight_bits)
+        return documents, weights
+
+    def _layout(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Postings in every block and where every block's weights start"""
+        if name not in self.layouts:
+            indptr = self.array(f"{name}/indptr").astype(np.int64)
+            block_indptr = self.array(f"{name}/block_indptr").astype(np.int64)
+            term = np.repeat(np.arange(len(indptr) - 1), np.diff(block_indptr))
+            position = (np.arange(len(term)) - block_indptr[term]) * self.block_size
+            counts = np.minimum(self.block_size, indptr[term + 1] - indptr[term] - position)
+            weight_sizes = 8 * counts if self.weight_bits is None else quantized_size(counts, self.weight_bits)
+            weight_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(weight_sizes, out=weight_offsets[1:])
+            self.layouts[name] = counts, weight_offsets
+        return self.layouts[name]
+
+    def _decode_postings(self, name: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Every block of a combination decoded at once back into the plain term by document arrays"""
+        indptr = self.array(f"{name}/indptr")
+        counts, weight_offsets = self._layout(name)
+        gaps = self.codec.decode_blocks(self.array(f"{name}/doc_bytes"), self.array(f"{name}/doc_offsets"), counts)
+        # Gaps run on across a term's blocks, so document ids are a cumulative sum restarted at every term
+        total = np.cumsum(gaps, dtype=np.int64)
+        term_counts = np.diff(indptr)
+        before = np.zeros(len(term_counts), dtype=np.int64)
+        held = (term_counts > 0) & (indptr[:-1] > 0)
+        before[held] = total[indptr[:-1][held] - 1]
+        indices = (total - np.repeat(before, term_counts) - 1).astype(np.int32)
+
+        weight_bytes = self.array(f"{name}/weight_bytes")
+        if self.weight_bits is None:
+            data = weight_bytes.view("<f8").astype(np.float64)
+        else:
+            codes = unpack_bit_blocks(weight_bytes, weight_offsets[:-1], counts,
+                                      np.full(len(counts), self.weight_bits, dtype=np.int64))
+            scales = self.array(f"{name}/block_max").astype(np.float64) / ((1 << self.weight_bits) - 1)
+            data = codes * np.repeat(scales, counts)
+        return indptr.copy(), indices, data
+
+    def _sparse(self, name: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.array(f"{name}/indptr"), self.array(f"{name}/indices"), self.array(f"{name}/data")
+
+    @staticmethod
+    def write(path: str, corpus, term_statistics: "TermStatistics", codec: str = None, weight_bits: int = None,
+              block_size: int = 128, combinations: List[Tuple[str, str]] = None) -> None:
+        """
+        Writes the index for a corpus from its columnar statistics. The file is written next to path and renamed over
+        it once complete, so a reader never maps a half written index. Without a codec the postings and document rows
+        are kept as plain arrays the engines map directly, with one the postings are compressed into blocks and the
+        rows left to be read back from them. Only the given
+        (vec_type, word_type) combinations are written, all of them by default.
+        """
+        if combinations is None:
+            combinations = [(vec_type, word_type) for vec_type in VEC_TYPES for word_type in WORD_TYPES]
+        if weight_bits is not None and not 1 <= weight_bits <= 16:
+            raise ValueError("Weights are quantized to between 1 and 16 bits")
+        postings_codec = get_codec(codec) if codec is not None else None
+        writer = _IndexWriter()
+        for word_type in WORD_TYPES:
+            writer.add_strings(f"lexicon/{word_type}",
+                               [str(word) for word in corpus.vector_space.__getattribute__(f"{word_type}_vectorspace")])
+            writer.add(f"statistics/{word_type}/document_frequency",
+                       term_statistics.term_data[word_type].document_frequency.astype(np.int32))
+        writer.add("statistics/doc_lengths", term_statistics.doc_lengths)
+
+        live = np.ones(len(corpus.documents), dtype=np.uint8)
+        live[list(corpus.deleted)] = 0
+        writer.add("documents/live", live)
+        for field in METADATA_FIELDS:
+            writer.add_strings(f"documents/{field}",
+                               [str(document.metadata.__getattribute__(field)) for document in corpus.documents])
+
+        for vec_type, word_type in combinations:
+            matrix = term_statistics.weight_matrix(vec_type, word_type).tocsr()
+            matrix.sort_indices()
+            postings = matrix.tocsc()
+            postings.sort_indices()
+            if postings_codec is None:
+                writer.add_sparse(f"vectors/{vec_type}/{word_type}", matrix)
+                writer.add_sparse(f"postings/{vec_type}/{word_type}", postings)
+            else:
+                writer.add_blocks(f"postings/{vec_type}/{word_type}", postings, postings_codec, weight_bits,
+                                  block_size)
+            upper_bounds = np.zeros(postings.shape[1])
+            held = np.diff(postings.indptr) > 0
+            if held.any():
+                upper_bounds[held] = np.maximum.reduceat(postings.data, postings.indptr[:-1][held])
+            writer.add(f"postings/{vec_type}/{word_type}/upper_bounds", upper_bounds)
+
+        writer.save(path, {
+            "number_of_documents": term_statistics.number_of_documents,
+            "document_count": len(corpus.documents),
+            "avg_doc_length": term_statistics.avg_doc_length,
+            "corpus_version": corpus.version,
+            "codec": codec,
+            "weight_bits": weight_bits,
+            "block_size": block_size,
+            "combinations": [list(combination) for combination in combinations],
+        })
+
+
+class BlockPostings:
+    """
+    Compressed postings of one term, read like the list of (document, weight) tuples they replace. A block is only
+    decoded when a posting in it is read, and next_geq jumps over whole blocks with the skip data.
+    """
+
+    def __init__(self, mapped_index: MappedIndex, name: str, term: int):
+        self.mapped_index = mapped_index
+        self.name = name
+        block_indptr = mapped_index.array(f"{name}/block_indptr")
+        self.first_block = int(block_indptr[term])
+        self.block_last = mapped_index.array(f"{name}/block_last")[self.first_block:int(block_indptr[term + 1])]
+        self.block_maxes = mapped_index.array(f"{name}/block_max")[self.first_block:int(block_indptr[term + 1])]
+        indptr = mapped_index.array(f"{name}/indptr")
+        self.count = int(indptr[term + 1] - indptr[term])
+        self.block_size = mapped_index.block_size
+        self.blocks: Dict[int, List[Tuple[int, float]]] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(self.count))]
+        if position < 0:
+            position += self.count
+        if not 0 <= position < self.count:
+            raise IndexError("Posting out of range")
+        return self._block(position // self.block_size)[position % self.block_size]
+
+    def __iter__(self):
+        for block in range(len(self.block_last)):
+            yield from self._block(block)
+
+    def next_geq(self, doc_id: int, lo: int = 0) -> int:
+        """Position of the first posting at or after lo whose document is at least doc_id, len if there is none"""
+        first = lo // self.block_size
+        block = first + int(np.searchsorted(self.block_last[first:], doc_id))
+        if block >= len(self.block_last):
+            return self.count
+        offset = bisect_left(self._block(block), (doc_id,), lo=max(lo - block * self.block_size, 0))
+        return block * self.block_size + offset
+
+    def block_max(self, position: int) -> float:
+        """Largest weight in the block holding a position, without decoding it"""
+        return float(self.block_maxes[position // self.block_size])
+
+    def block_max_of(self, doc_id: int, lo: int = 0) -> float:
+        """
+        Largest weight in the block that would hold doc_id, searching from the block holding position lo. Found from
+        the skip data without decoding, 0 if every block ends before doc_id.
+        """
+        first = lo // self.block_size
+        block = first + int(np.searchsorted(self.block_last[first:], doc_id))
+        if block >= len(self.block_last):
+            return 0.0
+        return float(self.block_maxes[block])
+
+    def _block(self, block: int) -> List[Tuple[int, float]]:
+        if block not in self.blocks:
+            previous = int(self.block_last[block - 1]) if block > 0 else -1
+            documents, weights = self.mapped_index.decode_block(self.name, self.first_block + block, previous)
+            self.blocks[block] = list(zip(documents.tolist(), weights.tolist()))
+        return self.blocks[block]
+
+
+class _IndexWriter:
+    """Collects the sections of an index file and lays them out aligned, in the order they were added"""
+
+    def __init__(self):
+        self.arrays: List[Tuple[str, np.ndarray]] = []
+
+    def add(self, name: str, array: np.ndarray) -> None:
+        self.arrays.append((name, np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))))
+
+    def add_strings(self, name: str, strings: List[str]) -> None:
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        self.add(f"{name}/offsets", offsets)
+        self.add(f"{name}/bytes", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def add_sparse(self, name: str, matrix) -> None:
+        self.add(f"{name}/indptr", matrix.indptr.astype(np.int32))
+        self.add(f"{name}/indices", matrix.indices.astype(np.int32))
+        self.add(f"{name}/data", matrix.data.astype(np.float64))
+
+    def add_blocks(self, name: str, postings, codec: PostingsCodec, weight_bits: Optional[int],
+                   block_size: int) -> None:
+        """Cuts every term's postings into blocks, each encoded on its own so it can be decoded without the others"""
+        block_indptr = [0]
+        block_last, block_max = [], []
+        doc_chunks, weight_chunks = [], []
+        doc_offsets = [0]
+        for term in range(postings.shape[1]):
+            start, end = postings.indptr[term], postings.indptr[term + 1]
+            previous = -1
+            for block_start in range(start, end, block_size):
+                documents = postings.indices[block_start:min(block_start + block_size, end)].astype(np.int64)
+                weights = postings.data[block_start:min(block_start + block_size, end)]
+                # Stored as float32 rounded up, so it stays an upper bound on the block's weights
+                largest = np.float32(weights.max())
+                if largest < weights.max():
+                    largest = np.nextafter(largest, np.float32(np.inf))
+                doc_chunks.append(codec.encode((np.diff(documents, prepend=previous)).astype(np.uint32)))
+                if weight_bits is None:
+                    weight_chunks.append(weights.astype("<f8").tobytes())
+                else:
+                    weight_chunks.append(quantize(weights, float(largest), weight_bits))
+                doc_offsets.append(doc_offsets[-1] + len(doc_chunks[-1]))
+                block_last.append(documents[-1])
+                block_max.append(largest)
+                previous = documents[-1]
+            block_indptr.append(len(block_last))
+
+        self.add(f"{name}/indptr", postings.indptr.astype(np.int32))
+        self.add(f"{name}/block_indptr", np.array(block_indptr, dtype=np.int32))
+        self.add(f"{name}/block_last", np.array(block_last, dtype=np.int32))
+        self.add(f"{name}/block_max", np.array(block_max, dtype=np.float32))
+        self.add(f"{name}/doc_offsets", np.array(doc_offsets, dtype=np.int64))
+        self.add(f"{name}/doc_bytes", np.frombuffer(b"".join(doc_chunks), dtype=np.uint8))
+        self.add(f"{name}/weight_bytes", np.frombuffer(b"".join(weight_chunks), dtype=np.uint8))
+
+    def save(self, path: str, statistics: dict) -> None:
+        temp_path = f"{path}.tmp"
+        checksum = 0
+        sections = {}
+        with open(temp_path, "wb") as file:
+            file.write(bytes(HEADER.size))
+            offset = HEADER.size
+            for name, array in self.arrays:
+                padding = -offset % ALIGNMENT
+                data = bytes(padding) + array.tobytes()
+                file.write(data)
+                checksum = zlib.crc32(data, checksum)
+                sections[name] = (array.dtype.str, offset + padding, len(array))
+                offset += len(data)
+            toc = json.dumps({**statistics, "sections": sections}).encode("utf-8")
+            file.write(toc)
+            checksum = zlib.crc32(toc, checksum)
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, checksum, offset, len(toc)))
+        replace_atomically(temp_path, path)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+PHRASE_PATTERN = re.compile(r'"([^"]+)"(?:~(\d+))?')
+
+
+@dataclass(frozen=True)
+class Phrase:
+    """Quoted query phrase, slop is how many extra tokens may sit between its terms"""
+    terms: Tuple[str, ...]
+    slop: int = 0
+
+
+class PositionalIndex:
+    """Token to per document position postings, answers phrase and proximity queries by intersecting postings"""
+
+    def __init__(self, corpus):
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+        self.version = corpus.version
+        for document in corpus.live_documents():
+            positions = document.positions
+            if positions is None:
+                positions = self._positions_from_content(document.raw_content)
+            for token, token_positions in positions.items():
+                self.postings.setdefault(token, {})[document.metadata.doc_id] = token_positions
+
+    @staticmethod
+    def _positions_from_content(raw_content: str) -> Dict[str, List[int]]:
+        """Documents parsed before positions were recorded fall back to their stored text"""
+        from utils.TextProcessor import DocumentProcessor
+        positions = {}
+        for position, token in enumerate(DocumentProcessor.tokenise(raw_content)):
+            positions.setdefault(token, []).append(position)
+        return positions
+
+    @staticmethod
+    def parse_query(usr_input: str) -> Tuple[str, List[Phrase]]:
+        """
+        Splits quoted phrases, optionally followed by ~slop for proximity, from the query. The returned text keeps the
+        phrase words so they are still scored, only the quoting and slop are removed.
+        """
+        from utils.TextProcessor import DocumentProcessor
+        phrases = []
+        for match in PHRASE_PATTERN.finditer(usr_input):
+            terms = tuple(DocumentProcessor.tokenise(match.group(1)))
+            if terms:
+                phrases.append(Phrase(terms, int(match.group(2) or 0)))
+        text = PHRASE_PATTERN.sub(lambda match: f" {match.group(1)} ", usr_input)
+        return text, phrases
+
+    def match(self, phrases: List[Phrase]) -> Optional[set[int]]:
+        """Documents matching every phrase, None when there are no phrases to restrict by"""
+        if not phrases:
+            return None
+        documents = None
+        for phrase in sorted(phrases, key=lambda phrase: self._rarest(phrase)):
+            documents = self._match_phrase(phrase, documents)
+            if not documents:
+                return set()
+        return documents
+
+    def _rarest(self, phrase: Phrase) -> int:
+        return min(len(self.postings.get(term, {})) for term in phrase.terms)
+
+    def _match_phrase(self, phrase: Phrase, restrict_to: Optional[set[int]]) -> set[int]:
+        term_postings = [self.postings.get(term, {}) for term in phrase.terms]
+        candidates = set(min(term_postings, key=len))
+        if restrict_to is not None:
+            candidates &= restrict_to
+        for postings in term_postings:
+            candidates.intersection_update(postings)
+            if not candidates:
+                return candidates
+
+        if len(phrase.terms) == 1:
+            return candidates
+        if phrase.slop == 0:
+            return {doc_id for doc_id in candidates if self._adjacent(term_postings, doc_id)}
+        return {doc_id for doc_id in candidates if self._within(term_postings, doc_id, phrase)}
+
+    @staticmethod
+    def _adjacent(term_postings: List[Dict[int, List[int]]], doc_id: int) -> bool:
+        """Terms appear consecutively and in order"""
+        following = [set(postings[doc_id]) for postings in term_postings[1:]]
+        return any(all(start + offset + 1 in positions for offset, positions in enumerate(following))
+                   for start in term_postings[0][doc_id])
+
+    @staticmethod
+    def _within(term_postings: List[Dict[int, List[int]]], doc_id: int, phrase: Phrase) -> bool:
+        """Every distinct term appears, in any order, inside a window of the phrase length plus slop"""
+        distinct = {}
+        for term, postings in zip(phrase.terms, term_postings):
+            distinct[term] = postings[doc_id]
+        window = len(phrase.terms) + phrase.slop
+        merged = sorted((position, term) for term, positions in distinct.items() for position in positions)
+
+        counts = {}
+        start = 0
+        for position, term in merged:
+            counts[term] = counts.get(term, 0) + 1
+            while merged[start][0] <= position - window:
+                start_term = merged[start][1]
+                counts[start_term] -= 1
+                if counts[start_term] == 0:
+                    del counts[start_term]
+                start += 1
+            if len(counts) == len(distinct):
+                return True
+        return False
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class PostingsCodec(ABC):
+    """
+    Interface for compressing a block of unsigned 32 bit integers, the gaps between consecutive document ids of a
+    postings list. Every codec is vectorised with NumPy so a block is encoded or decoded in a few array passes.
+    """
+    name: str
+
+    @abstractmethod
+    def encode(self, values: np.ndarray) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: np.ndarray, count: int) -> np.ndarray:
+        """The count values at the start of data, a uint8 array"""
+        pass
+
+    def decode_blocks(self, data: np.ndarray, offsets: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Values of consecutive blocks, block i holding counts[i] values from data[offsets[i]:offsets[i + 1]]"""
+        if len(counts) == 0:
+            return np.zeros(0, dtype=np.uint32)
+        return np.concatenate([self.decode(data[start:end], int(count))
+                               for start, end, count in zip(offsets[:-1], offsets[1:], counts)])
+
+
+class VarintCodec(PostingsCodec):
+    """7 bits per byte, least significant group first, the high bit is set on every byte but a value's last"""
+    name = "varint"
+
+    def encode(self, values: np.ndarray) -> bytes:
+        values = values.astype(np.uint64)
+        lengths = 1 + sum((values >= 1 << (7 * shift)).astype(np.int64) for shift in range(1, 5))
+        starts = np.cumsum(lengths) - lengths
+        output = np.zeros(int(lengths.sum()), dtype=np.uint8)
+        for byte in range(5):
+            held = lengths > byte
+            more = (lengths[held] > byte + 1).astype(np.uint64) << 7
+            output[starts[held] + byte] = ((values[held] >> np.uint64(7 * byte)) & np.uint64(0x7f)) | more
+        return output.tobytes()
+
+    def decode(self, data: np.ndarray, count: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros(0, dtype=np.uint32)
+        ends = np.flatnonzero(data < 0x80)[:count]
+        data = data[:ends[-1] + 1]
+        starts = np.empty(count, dtype=np.int64)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        value_of_byte = np.repeat(np.arange(count), ends - starts + 1)
+        shifts = 7 * (np.arange(len(data)) - starts[value_of_byte])
+        contributions = (data & 0x7f).astype(np.float64) * np.exp2(shifts)
+        return np.bincount(value_of_byte, weights=contributions, minlength=count).astype(np.uint32)
+
+    def decode_blocks(self, data: np.ndarray, offsets: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Consecutive varint blocks are one varint stream"""
+        return self.decode(data[offsets[0]:offsets[-1]], int(counts.sum())) if len(counts) else super().decode_blocks(
+            data, offsets, counts)
+
+
+class GroupVarintCodec(PostingsCodec):
+    """
+    Values in groups of four sharing a control byte of 2 bit lengths, each value then takes 1 to 4 little endian
+    bytes. The control bytes are stored ahead of the data, as in Stream VByte, so every value's offset comes from one
+    cumulative sum rather than walking the groups in turn.
+    """
+    name = "group-varint"
+
+    def encode(self, values: np.ndarray) -> bytes:
+        values = values.astype(np.uint64)
+        lengths = 1 + sum((values >= 1 << (8 * shift)).astype(np.int64) for shift in range(1, 4))
+        padded = np.zeros(-(-len(values) // 4) * 4, dtype=np.int64)
+        padded[:len(values)] = lengths - 1
+        control = (padded.reshape(-1, 4) << np.array([0, 2, 4, 6])).sum(axis=1).astype(np.uint8)
+        starts = np.cumsum(lengths) - lengths
+        output = np.zeros(int(lengths.sum()), dtype=np.uint8)
+        for byte in range(4):
+            held = lengths > byte
+            output[starts[held] + byte] = (values[held] >> np.uint64(8 * byte)) & np.uint64(0xff)
+        return control.tobytes() + output.tobytes()
+
+    def decode(self, data: np.ndarray, count: int) -> np.ndarray:
+        control_length = -(-count // 4)
+        control = data[:control_length]
+        lengths = ((control[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3).ravel()[:count].astype(np.int64)
+        lengths += 1
+        starts = control_length + np.cumsum(lengths) - lengths
+        values = np.zeros(count, dtype=np.uint32)
+        for byte in range(4):
+            held = lengths > byte
+            values[held] |= data[starts[held] + byte].astype(np.uint32) << np.uint32(8 * byte)
+        return values
+
+    def decode_blocks(self, data: np.ndarray, offsets: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        block, local = _positions(counts)
+        control = data[offsets[:-1][block] + local // 4]
+        lengths = ((control >> (2 * (local % 4)).astype(np.uint8)) & 3).astype(np.int64) + 1
+        ends = np.cumsum(lengths)
+        block_starts = np.cumsum(counts) - counts
+        # Offset of each value from the end of its block's control bytes, a cumulative sum restarted at every block
+        within = ends - lengths - (ends - lengths)[block_starts][block]
+        starts = offsets[:-1][block] + -(-counts // 4)[block] + within
+        values = np.zeros(len(block), dtype=np.uint32)
+        for byte in range(4):
+            held = lengths > byte
+            values[held] |= data[starts[held] + byte].astype(np.uint32) << np.uint32(8 * byte)
+        return values
+
+
+class BitPackedCodec(PostingsCodec):
+    """One width byte, then every value of the block packed at that many bits, the width of the largest value"""
+    name = "bitpacked"
+
+    def encode(self, values: np.ndarray) -> bytes:
+        width = int(values.max()).bit_length() if len(values) else 0
+        return bytes([width]) + pack_bits(values, width)
+
+    def decode(self, data: np.ndarray, count: int) -> np.ndarray:
+        return unpack_bits(data[1:], count, int(data[0]))
+
+    def decode_blocks(self, data: np.ndarray, offsets: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        return unpack_bit_blocks(data, offsets[:-1] + 1, counts, data[offsets[:-1]].astype(np.int64))
+
+
+CODECS = {codec.name: codec for codec in [VarintCodec(), GroupVarintCodec(), BitPackedCodec()]}
+
+
+def get_codec(name: str) -> PostingsCodec:
+    if name not in CODECS:
+        raise ValueError(f"Invalid codec {name}. Choose from 'varint', 'group-varint' or 'bitpacked'.")
+    return CODECS[name]
+
+
+def pack_bits(values: np.ndarray, width: int) -> bytes:
+    """Values at a fixed bit width, least significant bit first"""
+    if width == 0:
+        return b""
+    bits = (values.astype(np.uint64)[:, None] >> np.arange(width, dtype=np.uint64)) & np.uint64(1)
+    return np.packbits(bits.astype(np.uint8).ravel(), bitorder="little").tobytes()
+
+
+def unpack_bits(data: np.ndarray, count: int, width: int) -> np.ndarray:
+    if width == 0:
+        return np.zeros(count, dtype=np.uint32)
+    bits = np.unpackbits(data, count=count * width, bitorder="little").reshape(count, width)
+    return (bits.astype(np.uint64) << np.arange(width, dtype=np.uint64)).sum(axis=1).astype(np.uint32)
+
+
+def unpack_bit_blocks(data: np.ndarray, starts: np.ndarray, counts: np.ndarray, widths: np.ndarray) -> np.ndarray:
+    """Values of many bit packed blocks at once, block i starts at byte starts[i] and packs at widths[i] bits"""
+    block, local = _positions(counts)
+    if len(block) == 0:
+        return np.zeros(0, dtype=np.uint32)
+    bits = np.unpackbits(data, bitorder="little")
+    value_widths = widths[block]
+    bit_starts = starts[block] * 8 + local * value_widths
+    values = np.zeros(len(block), dtype=np.uint32)
+    for bit in range(int(widths.max())):
+        held = value_widths > bit
+        values[held] |= bits[bit_starts[held] + bit].astype(np.uint32) << np.uint32(bit)
+    return values
+
+
+def _positions(counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Block of every value and its position inside that block"""
+    block = np.repeat(np.arange(len(counts)), counts)
+    return block, np.arange(len(block)) - (np.cumsum(counts) - counts)[block]
+
+
+def quantize(weights: np.ndarray, scale: float, bits: int) -> bytes:
+    """Weights as bits wide codes of their fraction of scale, the largest weight of the block"""
+    levels = (1 << bits) - 1
+    codes = np.rint(weights / scale * levels) if scale > 0 else np.zeros(len(weights))
+    return pack_bits(np.clip(codes, 0, levels).astype(np.uint32), bits)
+
+
+def dequantize(data: np.ndarray, count: int, scale: float, bits: int) -> np.ndarray:
+    return unpack_bits(data, count, bits) * (scale / ((1 << bits) - 1))
+
+
+def quantized_size(count: int | np.ndarray, bits: int) -> int | np.ndarray:
+    """Bytes taken by count quantized weights"""
+    return -(-count * bits // 8)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import sys
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass
+class CacheStats:
+    """Hit and miss counters of the query cache"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of search results keyed on the normalised query. Entries are evicted by count and by an
+    estimate of their memory, and everything is dropped when the index it was computed against changes.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self.current_bytes = 0
+        self.index_version = None
+        self.stats = CacheStats()
+
+    @staticmethod
+    def make_key(tokens: list[str], word_type: str, vec_type: str, ner_words, *options) -> tuple:
+        """Token order and repeats beyond the multiset do not change the query vector so they share a key"""
+        return (tuple(sorted(Counter(tokens).items())), word_type, vec_type,
+                tuple(sorted(ner_words.values())), options)
+
+    def validate(self, index_version) -> None:
+        """Clears the cache if the corpus or document vectors have changed since it was filled"""
+        if self.index_version != index_version:
+            if self.entries:
+                self.stats.invalidations += 1
+            self.clear()
+            self.index_version = index_version
+
+    def get(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[0]
+
+    def put(self, key: tuple, value) -> None:
+        size = self._estimate_size(value)
+        if size > self.max_bytes or self.max_entries < 1:
+            return
+        if key in self.entries:
+            self.current_bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.current_bytes += size
+        while len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _estimate_size(value) -> int:
+        """Shallow sizes of the cached query vector weights and the result rows, enough to bound the cache"""
+        query_vec, results = value
+        size = sys.getsizeof(results)
+        for score, metadata, intersection in results:
+            size += sys.getsizeof(score) + sys.getsizeof(intersection)
+            size += sum(sys.getsizeof(word) for word in intersection)
+        for word_type in ["original", "stemmed", "lemmatized"]:
+            data = query_vec.__getattribute__(f"{word_type}_data")
+            size += sys.getsizeof(data.value) + sys.getsizeof(data.intersection)
+        return size
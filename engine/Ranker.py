@@ -1,33 +1,297 @@
 from __future__ import annotations
 
 import heapq
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import accumulate
+
+import numpy as np
+
+
+@dataclass
+class PruningStats:
+    """Counters reported by a pruned query evaluation"""
+    candidates: int = 0
+    scored: int = 0
+    skipped: int = 0
+    # Candidates dropped by the block maximums where the terms' upper bounds alone would have looked them up
+    block_skipped: int = 0
 
 
 class Ranker:
     """Ranks our documents"""
+    approximation_factor = 1.25
+    impact_block_size = 16
+
     @staticmethod
     def tf_idf_vector(word_type: str, vec_type: str, vector_store: "DocumentVectorStore", query_vec: "QueryVector",
-                      ner_words):
+                      entity_documents: list[set[int]], k: int = 10, allowed: set[int] = None,
+                      matrix: "csr_matrix" = None):
         heap = []
-        for index, vec in enumerate(vector_store.document_vectors):
-            vector = vec.__getattribute__(vec_type)
-            score = vector.dot_product(query_vec, word_type)
+        scores = Ranker.score_documents(word_type, vec_type, vector_store, query_vec, entity_documents, allowed,
+                                        matrix)
+        # Documents are visited in index order so ties in the heap resolve exactly as a full scan would
+        for index in sorted(scores):
+            heapq.heappush(heap, [scores[index], index])
+
+            if len(heap) > k:
+                heapq.heappop(heap)
 
-            if score > 0 and len(ner_words) > 0:
-                for word in ner_words.values():
-                    check_word = vector.word_manager.words["original"].get(f"{word[0]}, {word[1]}", None)
-                    if check_word is not None and check_word.type == word[1]:
-                        print("named entity")
-                        score *= 2
+        return Ranker.collect(word_type, vec_type, vector_store, query_vec, heap)
 
+    @staticmethod
+    def score_documents(word_type: str, vec_type: str, vector_store: "DocumentVectorStore",
+                        query_vec: "QueryVector", entity_documents: list[set[int]],
+                        allowed: set[int] = None, matrix: "csr_matrix" = None) -> dict[int, float]:
+        """
+        Positive, entity boosted scores of every document sharing a term with the query, when allowed is given only
+        those documents, such as the ones matching a phrase, are kept
+        """
+        scores = Ranker.accumulate_scores(word_type, vec_type, vector_store.get_inverted_index(), query_vec, matrix)
+        for index, score in list(scores.items()):
+            if allowed is not None and index not in allowed:
+                score = 0
+            elif score > 0 and len(entity_documents) > 0:
+                score *= Ranker._named_entity_boost(index, entity_documents)
             if score > 0:
-                heapq.heappush(heap, [score, index, vector.metadata,
-                                      vector.__getattribute__(f"{word_type}_data").intersection.intersection(
-                                          query_vec.__getattribute__(f"{word_type}_data").intersection)])
+                scores[index] = score
+            else:
+                del scores[index]
+        return scores
+
+    @staticmethod
+    def max_score(word_type: str, vec_type: str, vector_store: "DocumentVectorStore", query_vec: "QueryVector",
+                  entity_documents: list[set[int]], exact: bool = True, stats: PruningStats = None,
+                  allowed: set[int] = None, k: int = 10):
+        """
+        MaxScore evaluation, query terms whose summed upper bounds cannot beat the current kth best score are
+        non-essential, they are only looked up for documents found through the essential terms and documents are
+        dropped as soon as their remaining upper bound falls below the heap threshold. Compressed postings tighten
+        that bound with the largest weight of the block that would hold the document, so a block that cannot lift it
+        into the top k is never decoded. When exact is False the threshold is inflated by approximation_factor,
+        trading recall for more skipped documents.
+        """
+        if stats is None:
+            stats = PruningStats()
+        inverted_index = vector_store.get_inverted_index()
+        query_data = query_vec.__getattribute__(f"{word_type}_data")
+
+        terms = []
+        for word in query_data.intersection:
+            query_weight = query_data.value.get(word, 0)
+            postings = inverted_index.get_postings(vec_type, word_type, word)
+            if query_weight > 0 and postings:
+                terms.append((query_weight * inverted_index.get_upper_bound(vec_type, word_type, word), postings,
+                              query_weight))
+        terms.sort(key=lambda term: term[0])
+        cumulative = list(accumulate(term[0] for term in terms))
+        # Each entity found in a document doubles its score so bounds have to allow for every entity matching
+        boost_bound = 2 ** len(entity_documents)
+        factor = 1 if exact else Ranker.approximation_factor
+
+        pointers = [0] * len(terms)
+        first_essential = 0
+        threshold = 0
+        heap = []
+        while True:
+            candidate = None
+            for i in range(first_essential, len(terms)):
+                postings = terms[i][1]
+                if pointers[i] < len(postings) and (candidate is None or postings[pointers[i]][0] < candidate):
+                    candidate = postings[pointers[i]][0]
+            if candidate is None:
+                break
+            if allowed is not None and candidate not in allowed:
+                for i in range(first_essential, len(terms)):
+                    postings = terms[i][1]
+                    if pointers[i] < len(postings) and postings[pointers[i]][0] == candidate:
+                        pointers[i] += 1
+                continue
+            stats.candidates += 1
 
-            if len(heap) > 10:
+            score = 0
+            for i in range(first_essential, len(terms)):
+                postings = terms[i][1]
+                if pointers[i] < len(postings) and postings[pointers[i]][0] == candidate:
+                    score += postings[pointers[i]][1] * terms[i][2]
+                    pointers[i] += 1
+
+            pruned = False
+            remaining = list(accumulate(Ranker._block_bound(terms[i], candidate, pointers[i])
+                                        for i in range(first_essential)))
+            for i in range(first_essential - 1, -1, -1):
+                if (score + remaining[i]) * boost_bound < threshold:
+                    pruned = True
+                    if (score + cumulative[i]) * boost_bound >= threshold:
+                        stats.block_skipped += 1
+                    break
+                postings = terms[i][1]
+                pointers[i] = Ranker._next_geq(postings, candidate, pointers[i])
+                if pointers[i] < len(postings) and postings[pointers[i]][0] == candidate:
+                    score += postings[pointers[i]][1] * terms[i][2]
+            if pruned or score * boost_bound < threshold:
+                stats.skipped += 1
+                continue
+            stats.scored += 1
+
+            if score > 0 and len(entity_documents) > 0:
+                score *= Ranker._named_entity_boost(candidate, entity_documents)
+
+            if score > 0:
+                heapq.heappush(heap, [score, candidate])
+
+            if len(heap) > k:
                 heapq.heappop(heap)
 
-        docs = sorted([[score, metadata, intersection] for score, _, metadata, intersection in heap],
-                      key=lambda x: x[0], reverse=True)
-        return docs
+            if len(heap) == k:
+                threshold = heap[0][0] * factor
+                while first_essential < len(terms) and cumulative[first_essential] * boost_bound < threshold:
+                    first_essential += 1
+
+        return Ranker.collect(word_type, vec_type, vector_store, query_vec, heap)
+
+    @staticmethod
+    def anytime(word_type: str, vec_type: str, vector_store: "DocumentVectorStore", query_vec: "QueryVector",
+                entity_documents: list[set[int]], deadline: float, allowed: set[int] = None,
+                k: int = 10) -> tuple[list, bool]:
+        """
+        Impact ordered evaluation, blocks of postings are added highest query weight times document weight first
+        so the accumulated scores approach the final ranking as early as possible. Stops at the perf_counter deadline
+        and returns the best results so far with a flag that is True only if every posting was processed.
+        """
+        inverted_index = vector_store.get_inverted_index()
+        query_data = query_vec.__getattribute__(f"{word_type}_data")
+        block_size = Ranker.impact_block_size
+
+        frontier = []
+        for word in query_data.intersection:
+            query_weight = query_data.value.get(word, 0)
+            postings = inverted_index.get_impact_postings(vec_type, word_type, word)
+            if query_weight > 0 and postings:
+                heapq.heappush(frontier, (-query_weight * postings[0][1], word, 0, postings, query_weight))
+
+        scores = {}
+        while frontier and time.perf_counter() < deadline:
+            _, word, start, postings, query_weight = heapq.heappop(frontier)
+            for index, weight in postings[start:start + block_size]:
+                scores[index] = scores.get(index, 0) + weight * query_weight
+            start += block_size
+            if start < len(postings):
+                heapq.heappush(frontier, (-query_weight * postings[start][1], word, start, postings, query_weight))
+        exact = len(frontier) == 0
+
+        heap = []
+        for index in sorted(scores):
+            score = scores[index]
+            if allowed is not None and index not in allowed:
+                continue
+            if score > 0 and len(entity_documents) > 0:
+                score *= Ranker._named_entity_boost(index, entity_documents)
+            if score > 0:
+                heapq.heappush(heap, [score, index])
+            if len(heap) > k:
+                heapq.heappop(heap)
+
+        return Ranker.collect(word_type, vec_type, vector_store, query_vec, heap), exact
+
+    @staticmethod
+    def sparse_matrix(word_type: str, vec_type: str, vector_store: "DocumentVectorStore", query_vec: "QueryVector",
+                      entity_documents: list[set[int]], allowed: set[int] = None, matrix: "csr_matrix" = None,
+                      k: int = 10):
+        """
+        Scores the whole corpus with one sparse matrix-vector product and takes the top k by partition, matrix
+        replaces the stored document weights such as when they are recomputed with query time parameters
+        """
+        sparse_index = vector_store.get_sparse_index(query_vec.vector_space)
+        scores = sparse_index.score(vec_type, word_type, query_vec, matrix)
+        if allowed is not None:
+            mask = np.zeros(len(scores), dtype=bool)
+            mask[np.fromiter(allowed, dtype=np.int64, count=len(allowed))] = True
+            scores[~mask] = 0
+
+        for documents in entity_documents:
+            scores[np.fromiter(documents, dtype=np.int64, count=len(documents))] *= 2
+
+        return Ranker.collect(word_type, vec_type, vector_store, query_vec, sparse_index.top_k(scores, k))
+
+    @staticmethod
+    def sparse_matrix_many(word_type: str, vec_type: str, vector_store: "DocumentVectorStore",
+                           query_vecs: list["QueryVector"], k: int = 10) -> list[list]:
+        """Scores a batch of queries in one matrix-matrix product, returns the top k results for each query"""
+        if len(query_vecs) == 0:
+            return []
+        sparse_index = vector_store.get_sparse_index(query_vecs[0].vector_space)
+        scores = sparse_index.score_many(vec_type, word_type, query_vecs)
+        return [Ranker.collect(word_type, vec_type, vector_store, query_vec, sparse_index.top_k(scores[:, column], k))
+                for column, query_vec in enumerate(query_vecs)]
+
+    @staticmethod
+    def accumulate_scores(word_type: str, vec_type: str, inverted_index: "InvertedIndex",
+                          query_vec: "QueryVector", matrix: "csr_matrix" = None) -> dict[int, float]:
+        """
+        Term at a time dot product, only documents in the postings of a query term are touched. A document-term
+        matrix, such as the weights recomputed with query time parameters, replaces the stored postings with its
+        columns.
+        """
+        query_data = query_vec.__getattribute__(f"{word_type}_data")
+        if matrix is not None:
+            matrix = matrix.tocsc()
+            term_ids = query_vec.vector_space.get_term_ids(word_type)
+        scores = {}
+        for word in query_data.intersection:
+            query_weight = query_data.value.get(word, 0)
+            if query_weight == 0:
+                continue
+            if matrix is None:
+                postings = inverted_index.get_postings(vec_type, word_type, word)
+            elif word in term_ids:
+                start, end = matrix.indptr[term_ids[word]], matrix.indptr[term_ids[word] + 1]
+                postings = zip(matrix.indices[start:end].tolist(), matrix.data[start:end].tolist())
+            else:
+                continue
+            for index, weight in postings:
+                scores[index] = scores.get(index, 0) + weight * query_weight
+        return scores
+
+    @staticmethod
+    def _next_geq(postings, index: int, lo: int) -> int:
+        """Position of the first posting for index or a later document, compressed postings skip whole blocks"""
+        if hasattr(postings, "next_geq"):
+            return postings.next_geq(index, lo)
+        return bisect_left(postings, (index,), lo=lo)
+
+    @staticmethod
+    def _block_bound(term: tuple, index: int, lo: int) -> float:
+        """Most a term can add to a document's score, from the maximum of its block when the postings have skip data"""
+        bound, postings, query_weight = term
+        if hasattr(postings, "block_max_of"):
+            return min(bound, query_weight * postings.block_max_of(index, lo))
+        return bound
+
+    @staticmethod
+    def _named_entity_boost(index: int, entity_documents: list[set[int]]) -> int:
+        """Doubles the score for every selected entity the document holds"""
+        boost = 1
+        for documents in entity_documents:
+            if index in documents:
+                boost *= 2
+        return boost
+
+    @staticmethod
+    def ranked(scores: dict[int, float], n: int) -> list[list]:
+        """The n best [score, index] pairs, ordered as popping the top-n heap would leave them"""
+        return [[score, index] for index, score in
+                heapq.nlargest(n, scores.items(), key=lambda item: (item[1], item[0]))]
+
+    @staticmethod
+    def collect(word_type: str, vec_type: str, vector_store: "DocumentVectorStore", query_vec: "QueryVector",
+                heap: list) -> list:
+        """Turns the heap of [score, index] into sorted [score, metadata, matched words] results"""
+        query_intersection = query_vec.__getattribute__(f"{word_type}_data").intersection
+        docs = []
+        for score, index in heap:
+            vector = vector_store.get_vector(index).__getattribute__(vec_type)
+            document_data = vector.__getattribute__(f"{word_type}_data")
+            docs.append([score, vector.metadata, {word for word in query_intersection if word in document_data}])
+        return sorted(docs, key=lambda x: x[0], reverse=True)
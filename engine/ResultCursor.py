@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from engine.Ranker import Ranker
+
+
+class ResultCursor:
+    """Resumable view over a scored query, later pages are cut from the kept scores instead of rescoring"""
+
+    def __init__(self, word_type: str, vec_type: str, vector_store: "DocumentVectorStore", query_vec: "QueryVector",
+                 scores: dict[int, float], page_size: int = 10):
+        if page_size < 1:
+            raise ValueError("Page size must be at least 1")
+        self.word_type = word_type
+        self.vec_type = vec_type
+        self.vector_store = vector_store
+        self.query_vec = query_vec
+        self.scores = scores
+        self.page_size = page_size
+        self.ranked = []
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def page_count(self) -> int:
+        return -(-len(self.scores) // self.page_size)
+
+    def has_page(self, page: int) -> bool:
+        return 1 <= page <= self.page_count()
+
+    def page(self, page: int) -> list:
+        """Results for a 1-indexed page, empty once the scored documents run out"""
+        if page < 1:
+            raise ValueError("Pages are numbered from 1")
+        end = page * self.page_size
+        if end > len(self.ranked) and len(self.ranked) < len(self.scores):
+            # Only the depth asked for is ordered, so page 1 costs the same as a top-10 search
+            self.ranked = Ranker.ranked(self.scores, end)
+        return Ranker.collect(self.word_type, self.vec_type, self.vector_store, self.query_vec,
+                               self.ranked[end - self.page_size:end])
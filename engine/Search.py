@@ -1,42 +1,230 @@
-from nltk import WordNetLemmatizer, PorterStemmer
-from engine.Ranker import Ranker
+import threading
+import time
+
+from engine.PositionalIndex import PositionalIndex
+from engine.QueryCache import QueryCache
+from engine.Ranker import Ranker, PruningStats
+from engine.ResultCursor import ResultCursor
 from search_components.Corpus import CorpusManager
 from search_components.NamedEntityRecogniser import NamedEntityRecogniser
-from utils.utilities import UserInput, check_and_overwrite
+from search_components.Word import NamedEntityWord
+from utils.NormalisationCache import NormalisationCache
+from utils.TextProcessor import DocumentProcessor
+from utils.Persistence import Persister
+from utils.utilities import UserInput
 from vec.DocumentVectorStore import DocumentVectorStore
 
 
 class Search:
     """Our main search engine class"""
 
-    def __init__(self):
+    def __init__(self, save_policy: str = "changed", index_configuration: "IndexConfiguration" = None):
+        """
+        save_policy is 'never', 'always' or 'changed', see Persister. index_configuration names the vector and word
+        type combinations built up front, by default all of them, see IndexConfiguration.
+        """
+        # Seconds spent on each stage of start up, see utils.StartupProfiler
+        self.startup_timings: dict[str, float] = {}
+        started = time.perf_counter()
+        self.persister = Persister.get_instance()
+        self.persister.set_policy(save_policy)
+        # Held while the corpus is changed or pickled, so a background save never sees it half updated
+        self.lock = threading.RLock()
         self.corpus_manager = CorpusManager()
-        self.document_vector_store = DocumentVectorStore()
+        self.document_vector_store = DocumentVectorStore(configuration=index_configuration)
         raw_corp = self.corpus_manager.get_raw_corpus()
+        # Words already in the corpus are normalised from the forms stored with it, so NLTK is only imported for a
+        # query word the corpus has never seen
+        NormalisationCache.get_instance().update(
+            (word.original, word.stemmed, word.lemmatized) for word in raw_corp.word_manager.words["original"].values()
+            if not isinstance(word, NamedEntityWord))
+        started = self._time_startup("corpus load", started)
         self.ner_words = NamedEntityRecogniser(raw_corp)
+        started = self._time_startup("NER trie load", started)
         self.corpus_manager.raw_corpus = raw_corp
-        check_and_overwrite("./pklfiles/CorpusManager.pkl", self.corpus_manager)
+        self.save()
 
-        if self.document_vector_store.need_vector_generation:
-            self.document_vector_store.generate_vectors(self.corpus_manager.get_raw_corpus())
+        # Opens the memory mapped index, it is only regenerated if missing or written for another corpus
+        self.document_vector_store.load(raw_corp)
+        self._time_startup("index load", started)
 
 
         self.spellVec = None
-        self.lemmar = WordNetLemmatizer()
-        self.stemmer = PorterStemmer()
+        # None shares the normalisation cache's stemmer and lemmatizer, which load NLTK on the first cache miss
+        self.lemmar = None
+        self.stemmer = None
         self.search_input = None
+        self.pruning_stats = None
+        self.result_exact = True
+        self.query_cache = QueryCache()
+        self.positional_index = None
+        self.document_parser = None
 
-    def search(self, word_type, vec_type: str, usr_input: str, name_entities) -> list:
+    def search(self, word_type, vec_type: str, usr_input: str, name_entities, pruned=False, exact=True,
+               engine="inverted", weighting: "WeightingParameters" = None, deadline_ms: float = None) -> list:
+        """
+        Ranks the corpus for the input. Passing weighting scores against document weights recomputed with those BM25
+        parameters and field weights, through either engine, instead of the stored vectors. Passing deadline_ms
+        returns the best results found within that budget, result_exact records whether they are the full ranking.
+        """
+        if weighting is not None and (pruned or deadline_ms is not None):
+            raise ValueError("Query time weighting cannot be combined with pruned or deadline bounded search, their "
+                             "bounds and impact order come from the stored weights.")
+        started = time.perf_counter()
         self.search_input = None
-        self.search_input = UserInput.process_input(usr_input, self.corpus_manager.get_raw_corpus().word_manager,
+        self.result_exact = True
+        self._ensure_current(vec_type, word_type)
+        text, phrases = PositionalIndex.parse_query(usr_input)
+        tokens = DocumentProcessor.tokenise(text)
+        self.query_cache.validate(self._index_version())
+        cache_key = QueryCache.make_key(tokens, word_type, vec_type, name_entities, pruned, exact, engine,
+                                        tuple(phrases), weighting)
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            self.search_input, results = cached
+            self.pruning_stats = None
+            return [list(result) for result in results]
+
+        self.search_input = UserInput.process_tokens(tokens, self.corpus_manager.get_raw_corpus().word_manager,
+                                                     self.corpus_manager.get_raw_corpus().vector_space, self.stemmer,
+                                                     self.lemmar)
+        self.search_input.query_expansion(word_type)
+        # The phrase index is only built by the first query that quotes a phrase
+        allowed = self.get_positional_index().match(phrases) if phrases else None
+        if weighting is not None:
+            matrix = self.document_vector_store.get_term_statistics(
+                self.corpus_manager.get_raw_corpus()).weight_matrix(vec_type, word_type, weighting)
+            results = self._rank(word_type, vec_type, self.search_input, name_entities, engine, allowed, matrix)
+        elif deadline_ms is not None:
+            results, self.result_exact = Ranker.anytime(word_type, vec_type, self.document_vector_store,
+                                                        self.search_input,
+                                                        self.ner_words.get_entity_documents(name_entities),
+                                                        started + deadline_ms / 1000, allowed)
+        elif pruned:
+            self.pruning_stats = PruningStats()
+            results = Ranker.max_score(word_type, vec_type, self.document_vector_store, self.search_input,
+                                       self.ner_words.get_entity_documents(name_entities), exact,
+                                       self.pruning_stats, allowed)
+        else:
+            results = self._rank(word_type, vec_type, self.search_input, name_entities, engine, allowed)
+        if self.result_exact:
+            self.query_cache.put(cache_key, (self.search_input, [list(result) for result in results]))
+        return results
+
+    def search_cursor(self, word_type, vec_type: str, usr_input: str, name_entities, page_size=10) -> ResultCursor:
+        """Scores the query once and returns a cursor that serves any page of the results"""
+        self._ensure_current(vec_type, word_type)
+        text, phrases = PositionalIndex.parse_query(usr_input)
+        self.search_input = UserInput.process_input(text, self.corpus_manager.get_raw_corpus().word_manager,
                                                     self.corpus_manager.get_raw_corpus().vector_space, self.stemmer,
                                                     self.lemmar)
         self.search_input.query_expansion(word_type)
-        return Ranker.tf_idf_vector(word_type, vec_type, self.document_vector_store, self.search_input, name_entities)
+        scores = Ranker.score_documents(word_type, vec_type, self.document_vector_store, self.search_input,
+                                        self.ner_words.get_entity_documents(name_entities),
+                                        self.get_positional_index().match(phrases) if phrases else None)
+        return ResultCursor(word_type, vec_type, self.document_vector_store, self.search_input, scores, page_size)
 
-    def rerank(self, word_type, vec_type: str, usr_input: "QueryVector") -> list:
+    def rerank(self, word_type, vec_type: str, usr_input: "QueryVector", engine="inverted") -> list:
         self.search_input = usr_input
-        return Ranker.tf_idf_vector(word_type, vec_type, self.document_vector_store, usr_input, {})
+        self._ensure_current(vec_type, word_type)
+        return self._rank(word_type, vec_type, usr_input, {}, engine)
+
+    def search_many(self, word_type, vec_type: str, queries: list[str], k=10) -> list[list]:
+        """Batch search for offline jobs, every query is scored in a single pass over the corpus"""
+        self._ensure_current(vec_type, word_type)
+        query_vecs = UserInput.process_inputs(queries, self.corpus_manager.get_raw_corpus().word_manager,
+                                              self.corpus_manager.get_raw_corpus().vector_space, self.stemmer,
+                                              self.lemmar)
+        for query_vec in query_vecs:
+            query_vec.query_expansion(word_type)
+        return Ranker.sparse_matrix_many(word_type, vec_type, self.document_vector_store, query_vecs, k)
+
+    def save(self) -> "Future":
+        """Snapshots the corpus in the background under the save policy, returns a future of the SaveReport"""
+        return self.corpus_manager.save(self.lock)
+
+    def add_document(self, path: str, metadata: "DocumentMetaData" = None) -> int:
+        """
+        Parses and indexes one new document, returns its id. Vectors are reweighed on the next query. Without metadata
+        it is looked up in the labels file by path, and a page the file does not list is indexed with metadata holding
+        only its url.
+        """
+        document = self._parse_document(path, metadata)
+        with self.lock:
+            return self.corpus_manager.get_raw_corpus().add_document(document)
+
+    def update_document(self, doc_id: int, path: str) -> None:
+        """Reparses the document with this id from path, keeping its id and metadata"""
+        raw_corp = self.corpus_manager.get_raw_corpus()
+        if raw_corp.get_document_by_id(doc_id) is None:
+            raise KeyError(f"No document with id {doc_id}")
+        document = self._parse_document(path, raw_corp.get_document_by_id(doc_id).metadata)
+        with self.lock:
+            raw_corp.update_document(doc_id, document)
+
+    def delete_document(self, doc_id: int) -> bool:
+        """
+        Removes a document from the results, it keeps its id until compact is called so ids held from earlier results
+        stay valid. Returns whether enough ids are now dead that the corpus should be compacted.
+        """
+        raw_corp = self.corpus_manager.get_raw_corpus()
+        with self.lock:
+            raw_corp.delete_document(doc_id)
+        return raw_corp.needs_compaction()
+
+    def compact(self) -> dict[int, int]:
+        """
+        Drops deleted documents and renumbers the rest, returns the old to new id mapping. Ids held from earlier
+        results or cursors must be translated through it.
+        """
+        with self.lock:
+            return self.corpus_manager.get_raw_corpus().compact()
+
+    def _time_startup(self, stage: str, started: float) -> float:
+        finished = time.perf_counter()
+        self.startup_timings[stage] = finished - started
+        return finished
+
+    def _parse_document(self, path: str, metadata: "DocumentMetaData" = None) -> "Document":
+        if self.document_parser is None:
+            from utils.Parser import DocumentParser
+            self.document_parser = DocumentParser()
+        return self.document_parser.parse(path, metadata=metadata)
+
+    def _ensure_current(self, vec_type: str, word_type: str) -> None:
+        """
+        Brings the vectors and entity postings up to date after documents were added, updated or deleted, and builds
+        the combination about to be queried if the index configuration left it out
+        """
+        raw_corp = self.corpus_manager.get_raw_corpus()
+        if self.document_vector_store.refresh(raw_corp):
+            self.ner_words.entity_postings = NamedEntityRecogniser._build_entity_postings(raw_corp)
+        self.document_vector_store.materialize(vec_type, word_type)
+
+    def get_positional_index(self) -> PositionalIndex:
+        """Phrase index over the corpus, rebuilt if the documents have changed since it was built"""
+        raw_corp = self.corpus_manager.get_raw_corpus()
+        if self.positional_index is None or self.positional_index.version != raw_corp.version:
+            self.positional_index = PositionalIndex(raw_corp)
+        return self.positional_index
+
+    def _index_version(self) -> tuple:
+        """Changes whenever the corpus or the document vectors are replaced or regenerated"""
+        raw_corp = self.corpus_manager.get_raw_corpus()
+        return (id(raw_corp), raw_corp.version, id(self.document_vector_store.document_vectors),
+                self.document_vector_store.version)
+
+    def _rank(self, word_type, vec_type: str, query_vec: "QueryVector", name_entities, engine: str,
+              allowed: set[int] = None, matrix: "csr_matrix" = None) -> list:
+        """Scores with the inverted index or with the sparse matrix engine, matrix replaces the stored weights"""
+        entity_documents = self.ner_words.get_entity_documents(name_entities)
+        if engine == "inverted":
+            return Ranker.tf_idf_vector(word_type, vec_type, self.document_vector_store, query_vec, entity_documents,
+                                        allowed=allowed, matrix=matrix)
+        elif engine == "sparse":
+            return Ranker.sparse_matrix(word_type, vec_type, self.document_vector_store, query_vec, entity_documents,
+                                        allowed, matrix)
+        raise ValueError(f"Invalid engine {engine}. Choose from 'inverted' or 'sparse'.")
 
     def relevance_feedback(self, word_type, vec_type, relevant_document_id: list[int]):
         relevant_docs = []
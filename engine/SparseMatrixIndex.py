@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from engine.InvertedIndex import VEC_TYPES, WORD_TYPES
+
+
+class SparseMatrixIndex:
+    """CSR document-term matrices over the vector space vocabulary, one per vector type and word type"""
+
+    def __init__(self, document_vectors, vector_space, mapped_index: "MappedIndex" = None):
+        self.document_vectors = document_vectors
+        self.vector_space = vector_space
+        # When the vectors come from an index file its postings already are the matrices
+        self.mapped_index = mapped_index
+        self.number_of_documents = len(document_vectors)
+        self.matrices: Dict[Tuple[str, str], csr_matrix] = {}
+
+    def get_matrix(self, vec_type: str, word_type: str) -> csr_matrix:
+        """Compiles the matrix for a combination the first time it is scored"""
+        if vec_type not in VEC_TYPES or word_type not in WORD_TYPES:
+            raise ValueError(f"Invalid vector type {vec_type} or word type {word_type}")
+        if (vec_type, word_type) not in self.matrices:
+            self.matrices[(vec_type, word_type)] = self._compile(vec_type, word_type)
+        return self.matrices[(vec_type, word_type)]
+
+    def _compile(self, vec_type: str, word_type: str) -> csr_matrix:
+        if self.mapped_index is not None and self.mapped_index.has_combination(vec_type, word_type):
+            return self.mapped_index.get_matrix(vec_type, word_type)
+        term_ids = self.vector_space.get_term_ids(word_type)
+        rows, columns, weights = [], [], []
+        # The stored vectors already hold their term ids and weights as arrays, no word is looked up
+        for index, vector_store in enumerate(self.document_vectors):
+            if vector_store is None:
+                continue
+            term_weights = vector_store.__getattribute__(vec_type).__getattribute__(f"{word_type}_data")
+            rows.append(np.full(len(term_weights), index, dtype=np.int64))
+            columns.append(term_weights.term_ids)
+            weights.append(term_weights.weights)
+        if not rows:
+            return csr_matrix((self.number_of_documents, len(term_ids)))
+        return csr_matrix((np.concatenate(weights).astype(np.float64), (np.concatenate(rows), np.concatenate(columns))),
+                          shape=(self.number_of_documents, len(term_ids)))
+
+    def query_vector(self, word_type: str, query_vec: "QueryVector") -> csr_matrix:
+        """Sparse column vector of the query weights, words outside the vocabulary cannot match and are dropped"""
+        term_ids = self.vector_space.get_term_ids(word_type)
+        query_data = query_vec.__getattribute__(f"{word_type}_data")
+        columns, weights = [], []
+        for word in query_data.intersection:
+            weight = query_data.value.get(word, 0)
+            if weight != 0 and word in term_ids:
+                columns.append(term_ids[word])
+                weights.append(weight)
+        return csr_matrix((np.array(weights, dtype=np.float64), (np.array(columns, dtype=np.int64),
+                                                                 np.zeros(len(columns), dtype=np.int64))),
+                          shape=(len(term_ids), 1))
+
+    def query_matrix(self, word_type: str, query_vecs: list["QueryVector"]) -> csr_matrix:
+        """Query vectors stacked as the columns of one vocabulary by queries matrix"""
+        term_ids = self.vector_space.get_term_ids(word_type)
+        rows, columns, weights = [], [], []
+        for column, query_vec in enumerate(query_vecs):
+            query_data = query_vec.__getattribute__(f"{word_type}_data")
+            for word in query_data.intersection:
+                weight = query_data.value.get(word, 0)
+                if weight != 0 and word in term_ids:
+                    rows.append(term_ids[word])
+                    columns.append(column)
+                    weights.append(weight)
+        return csr_matrix((np.array(weights, dtype=np.float64), (np.array(rows, dtype=np.int64),
+                                                                 np.array(columns, dtype=np.int64))),
+                          shape=(len(term_ids), len(query_vecs)))
+
+    def score_many(self, vec_type: str, word_type: str, query_vecs: list["QueryVector"]) -> np.ndarray:
+        """Documents by queries score matrix from a single matrix-matrix product"""
+        scores = self.get_matrix(vec_type, word_type) @ self.query_matrix(word_type, query_vecs)
+        return scores.toarray()
+
+    def score(self, vec_type: str, word_type: str, query_vec: "QueryVector", matrix: csr_matrix = None) -> np.ndarray:
+        """Scores of every document from a single matrix-vector product, against the stored weights by default"""
+        if matrix is None:
+            matrix = self.get_matrix(vec_type, word_type)
+        scores = matrix @ self.query_vector(word_type, query_vec)
+        return scores.toarray().ravel()
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int = 10) -> list[list]:
+        """Positive scores only, ties prefer the later document as the heap based ranker does"""
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = np.lexsort((-candidates, -scores[candidates]))
+        return [[float(scores[index]), int(index)] for index in candidates[order]]
@@ -7,3 +7,22 @@ class VectorSpace:
         self.lemmatized_vectorspace = numpy.array(list(corpus_word_manager.words['lemmatized'].keys()))
         self.stemmed_vectorspace = numpy.array(list(corpus_word_manager.words['stemmed'].keys()))
         self.original_vectorspace = numpy.array(list(corpus_word_manager.words['original'].keys()))
+
+    def get_term_ids(self, word_type: str) -> dict[str, int]:
+        """Column of each word in the vector space, built lazily so older pickled spaces still work"""
+        term_ids = self.__dict__.setdefault("_term_ids", {})
+        if word_type not in term_ids:
+            vector_space = self.__getattribute__(f"{word_type}_vectorspace")
+            term_ids[word_type] = {str(word): index for index, word in enumerate(vector_space)}
+        return term_ids[word_type]
+
+    def extend(self, corpus_word_manager) -> None:
+        """Appends words that have entered the corpus since the space was built, existing columns never move"""
+        for word_type in ["lemmatized", "stemmed", "original"]:
+            term_ids = self.get_term_ids(word_type)
+            new_words = [word for word in corpus_word_manager.count[word_type] if word not in term_ids]
+            if new_words:
+                vector_space = self.__getattribute__(f"{word_type}_vectorspace")
+                self.__setattr__(f"{word_type}_vectorspace", numpy.append(vector_space, new_words))
+                for word in new_words:
+                    term_ids[word] = len(term_ids)
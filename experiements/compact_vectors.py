@@ -0,0 +1,82 @@
+import os
+import tempfile
+import tracemalloc
+
+from engine.InvertedIndex import VEC_TYPES, WORD_TYPES
+from engine.Search import Search
+from vec.DocumentVectorStore import DocumentVectorStore
+from vec.TermStatistics import TermStatistics
+from vec.Vector import VectorData
+
+search = Search(save_policy="never")
+corpus = search.corpus_manager.get_raw_corpus()
+queries = ["final fantasy", "crazy taxi", "james bond", "star wars battlefront", "guitar hero rock"]
+combinations = [(vec_type, word_type) for vec_type in VEC_TYPES for word_type in WORD_TYPES]
+directory = tempfile.mkdtemp()
+
+
+def rankings(store: DocumentVectorStore, vec_type: str, word_type: str, **options) -> list:
+    search.document_vector_store = store
+    search.query_cache.clear()
+    return [[metadata.doc_id for _, metadata, _ in search.search(word_type, vec_type, query, {}, **options)]
+            for query in queries]
+
+
+def traced(build) -> tuple:
+    """What build returns and the bytes it allocated that are still held"""
+    tracemalloc.start()
+    result = build()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held
+
+
+def dictionary_vectors() -> list:
+    """The set and dictionary of every word type and vector type, as the VectorData of the old vectors held them"""
+    term_statistics = TermStatistics(corpus)
+    vectors = []
+    for vec_type, word_type in combinations:
+        for value in term_statistics.document_weights(vec_type, word_type):
+            vector_data = VectorData(set(value))
+            vector_data.value = value
+            vectors.append(vector_data)
+    return vectors
+
+
+def compact_vectors(weight_dtype: str) -> DocumentVectorStore:
+    store = DocumentVectorStore(os.path.join(directory, f"{weight_dtype}.bin"), weight_dtype=weight_dtype)
+    store._build_vectors(corpus)
+    store.term_statistics = None
+    return store
+
+
+dictionaries, dictionary_bytes = traced(dictionary_vectors)
+del dictionaries
+print(f"{'representation':<28}{'memory':>10}{'per document':>16}")
+print(f"{'set and dictionary':<28}{dictionary_bytes / 1e6:>8.1f}MB{dictionary_bytes / len(corpus.documents):>14.0f}B")
+
+stores = {}
+for weight_dtype in ["float32", "float16"]:
+    stores[weight_dtype], held = traced(lambda: compact_vectors(weight_dtype))
+    print(f"{f'arrays, {weight_dtype} weights':<28}{held / 1e6:>8.1f}MB{held / len(corpus.documents):>14.0f}B"
+          f"  {dictionary_bytes / held:.1f}x smaller")
+
+# Written at full precision, the mapped store serves float64 weights to compare against
+DocumentVectorStore(os.path.join(directory, "float64.bin")).generate_vectors(corpus)
+reference = DocumentVectorStore(os.path.join(directory, "float64.bin"))
+reference.load(corpus)
+engines = [("inverted", {}), ("pruned", {"pruned": True}), ("sparse", {"engine": "sparse"})]
+live = [doc_id for doc_id in range(len(corpus.documents)) if reference.get_vector(doc_id) is not None]
+
+for weight_dtype, store in stores.items():
+    # Scored against the float64 vector, the error of a document's dot product with itself
+    worst = max(abs(store.get_vector(doc_id).__getattribute__(vec_type).dot_product(
+        reference.get_vector(doc_id).__getattribute__(vec_type), word_type) -
+        reference.get_vector(doc_id).__getattribute__(vec_type).dot_product(
+            reference.get_vector(doc_id).__getattribute__(vec_type), word_type))
+        for vec_type, word_type in combinations for doc_id in live[::7])
+    identical = {engine: sum(rankings(store, *combination, **options) == rankings(reference, *combination, **options)
+                             for combination in combinations)
+                 for engine, options in engines}
+    print(f"{weight_dtype}: largest self dot product error {worst:.2e}, rankings identical to float64 "
+          + ", ".join(f"{engine} {count} of {len(combinations)}" for engine, count in identical.items()))
@@ -0,0 +1,90 @@
+import heapq
+import random
+import time
+
+from engine.Search import Search
+
+search = Search()
+corpus = search.corpus_manager.get_raw_corpus()
+word_manager = corpus.word_manager
+store = search.document_vector_store
+
+
+def reference_matrix():
+    """The dictionary of {word: {doc_id: weight}} the co-occurrence pipeline was first written against"""
+    output = {}
+    for word in word_manager.words["lemmatized"].keys():
+        output[word] = {}
+        for vectors in store.document_vectors:
+            if vectors is None:
+                continue
+            word_value = vectors.BM25plusVector.lemmatized_data.value.get(word, 0)
+            if word_value > 0:
+                output[word][vectors.BM25plusVector.metadata.doc_id] = word_value
+    return output
+
+
+def reference_neighbours(word_matrix, keys, i):
+    """The original pairwise loop for a single word"""
+    heap = []
+    for j in range(i + 1, len(keys)):
+        word = keys[j]
+        total = 0
+        count = 0
+        for doc_id in set(word_matrix[keys[i]]).union(word_matrix[word]):
+            original_word = word_matrix[keys[i]].get(doc_id, 0)
+            compare_word = word_matrix[word].get(doc_id, 0)
+            total += original_word * compare_word
+            if original_word > 0 and compare_word > 0:
+                count += 1
+        if total > 0 and count > 3:
+            heapq.heappush(heap, (total, word))
+        while len(heap) > 2:
+            heapq.heappop(heap)
+    return {word for _, word in heap}
+
+
+start = time.perf_counter()
+matrix = store.gen_word_matrix(corpus)
+build = time.perf_counter() - start
+
+# Compute the neighbours from scratch and restore what was loaded afterwards, named entities keep none
+entries = {word: entry for word, entry in word_manager.words["lemmatized"].items()
+           if hasattr(entry, "lemmatized_concurrent")}
+saved = {word: set(entry.lemmatized_concurrent) for word, entry in entries.items()}
+for entry in entries.values():
+    entry.lemmatized_concurrent.clear()
+word_manager.generate_word_matrix(matrix)
+start = time.perf_counter()
+word_manager.generate_concurrent_words()
+neighbours = time.perf_counter() - start
+computed = {word: set(getattr(entry, "lemmatized_concurrent", ())) for word, entry in
+            word_manager.words["lemmatized"].items()}
+for word, entry in entries.items():
+    entry.lemmatized_concurrent.clear()
+    entry.lemmatized_concurrent.update(saved[word])
+print(f"{matrix.matrix.shape[0]} words x {matrix.matrix.shape[1]} documents, {matrix.matrix.nnz} weights")
+print(f"matrix built in {build:.2f}s, neighbours in {neighbours:.2f}s")
+
+# The sparse matrix has to hold exactly the weights of the dictionary it replaces
+expected = reference_matrix()
+actual = matrix.matrix.tocsr()
+differing = 0
+for row, word in enumerate(matrix.words):
+    entries = actual[row]
+    if dict(zip(entries.indices.tolist(), entries.data.tolist())) != expected[word]:
+        differing += 1
+print(f"{len(matrix.words) - differing} of {len(matrix.words)} matrix rows identical")
+
+# The original loop is quadratic in the vocabulary, so it is only run for a sample of words
+keys = list(expected.keys())
+random.seed(0)
+sample = sorted(random.sample(range(len(keys)), min(200, len(keys))))
+start = time.perf_counter()
+mismatches = [keys[i] for i in sample if reference_neighbours(expected, keys, i) != computed[keys[i]]]
+reference = time.perf_counter() - start
+print(f"{len(sample) - len(mismatches)} of {len(sample)} sampled words have identical neighbours")
+for word in mismatches[:10]:
+    print(f"    differs on {word}")
+print(f"original loop: {reference:.2f}s for {len(sample)} words, about {reference / len(sample) * len(keys):.0f}s "
+      f"for all {len(keys)}")
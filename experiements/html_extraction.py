@@ -0,0 +1,36 @@
+import os
+import time
+
+from utils.HTMLExtractor import SoupExtractor, StreamingExtractor
+from utils.Parser import DocumentParser
+
+directory = "./dataset/videogame"
+paths = [os.path.join(directory, filename) for filename in sorted(os.listdir(directory))]
+pages = []
+for path in paths:
+    with open(path, "rb") as file:
+        pages.append(file.read())
+
+# Every backend has to give exactly the output of the BeautifulSoup tree walk
+reference = SoupExtractor()
+backends = {"soup": reference, "streaming": StreamingExtractor()}
+expected = [reference.extract(page) for page in pages]
+for name, backend in backends.items():
+    mismatches = [path for path, page, result in zip(paths, pages, expected) if backend.extract(page) != result]
+    print(f"{name}: {len(pages) - len(mismatches)} of {len(pages)} pages identical")
+    for path in mismatches:
+        print(f"    differs on {path}")
+
+# Extraction alone, then full ingestion through the parser with each backend
+for name, backend in backends.items():
+    start = time.perf_counter()
+    for page in pages:
+        backend.extract(page)
+    extraction = time.perf_counter() - start
+
+    parser = DocumentParser(extractor=backend)
+    start = time.perf_counter()
+    for path in paths:
+        parser.parse_compact(path)
+    ingestion = time.perf_counter() - start
+    print(f"{name}: extraction {extraction:.2f}s, ingestion {ingestion:.2f}s for {len(pages)} pages")
@@ -0,0 +1,31 @@
+import time
+
+from engine.MappedIndex import MappedIndex
+from engine.Search import Search
+
+search = Search()
+corpus = search.corpus_manager.get_raw_corpus()
+store = search.document_vector_store
+
+start = time.perf_counter()
+index = MappedIndex.open(store.index_path)
+opened = time.perf_counter() - start
+start = time.perf_counter()
+index.verify()
+verified = time.perf_counter() - start
+print(f"index opened in {opened * 1000:.2f}ms, checksum verified in {verified * 1000:.2f}ms")
+
+# Results served from the mapped index have to match vectors built in memory from the same corpus
+queries = ["final fantasy", "crazy taxi", "james bond", "star wars battlefront", "guitar hero rock"]
+engines = ["inverted", "sparse"]
+mapped = {(query, engine): search.search("lemmatized", "BM25plusFieldVector", query, {}, engine=engine)
+          for query in queries for engine in engines}
+search.query_cache.clear()
+store._build_vectors(corpus)
+differing = [key for key, results in mapped.items()
+             if [(score, metadata.doc_id) for score, metadata, _ in results]
+             != [(score, metadata.doc_id) for score, metadata, _ in
+                 search.search("lemmatized", "BM25plusFieldVector", key[0], {}, engine=key[1])]]
+print(f"{len(mapped) - len(differing)} of {len(mapped)} rankings identical")
+for query, engine in differing:
+    print(f"    differs on {query} with {engine}")
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+from engine.InvertedIndex import VEC_TYPES, WORD_TYPES
+from engine.MappedIndex import MappedIndex
+from engine.Search import Search
+from vec.DocumentVectorStore import DocumentVectorStore, IndexConfiguration, SERVING_CONFIGURATION
+
+search = Search(save_policy="never")
+corpus = search.corpus_manager.get_raw_corpus()
+queries = ["final fantasy", "crazy taxi", "james bond", "star wars battlefront", "guitar hero rock"]
+combinations = [(vec_type, word_type) for vec_type in VEC_TYPES for word_type in WORD_TYPES]
+directory = tempfile.mkdtemp()
+
+
+def rankings(store: DocumentVectorStore, vec_type: str, word_type: str, **options) -> list:
+    search.document_vector_store = store
+    search.query_cache.clear()
+    return [[metadata.doc_id for _, metadata, _ in search.search(word_type, vec_type, query, {}, **options)]
+            for query in queries]
+
+
+def generate(configuration: IndexConfiguration, name: str) -> tuple[DocumentVectorStore, float]:
+    store = DocumentVectorStore(os.path.join(directory, name), configuration=configuration)
+    started = time.perf_counter()
+    store.generate_vectors(corpus)
+    return store, time.perf_counter() - started
+
+
+full, full_seconds = generate(IndexConfiguration(), "full.bin")
+serving, serving_seconds = generate(SERVING_CONFIGURATION, "serving.bin")
+full_index = MappedIndex.open(os.path.join(directory, "full.bin"))
+
+# Memory of each combination's document weights, built one at a time into vectors that hold none
+empty, _ = generate(IndexConfiguration(()), "empty.bin")
+memory = {}
+tracemalloc.start()
+for combination in combinations:
+    before = tracemalloc.get_traced_memory()[0]
+    empty.materialize(*combination)
+    memory[combination] = tracemalloc.get_traced_memory()[0] - before
+tracemalloc.stop()
+
+print(f"{'combination':<38}{'build':>10}{'memory':>12}{'index':>12}  rankings")
+for combination in combinations:
+    file_bytes = sum(full_index.sections[name][2] * int(full_index.sections[name][0][2:])
+                     for name in full_index.sections if name.startswith(
+                         (f"vectors/{combination[0]}/{combination[1]}/", f"postings/{combination[0]}/{combination[1]}/")))
+    # The serving store builds the combination on its first query, its results must match the eager store
+    identical = sum(rankings(full, *combination, **options) == rankings(serving, *combination, **options)
+                    for options in [{}, {"pruned": True}, {"engine": "sparse"}])
+    eager = "eager" if combination in SERVING_CONFIGURATION.eager else "lazy"
+    print(f"{f'{combination[0]}/{combination[1]} ({eager})':<38}{full.build_seconds[combination] * 1000:>8.1f}ms"
+          f"{memory[combination] / 1e6:>10.2f}MB{file_bytes / 1e6:>10.2f}MB  {identical} of 3 engines identical")
+
+saved = [combination for combination in combinations if combination not in SERVING_CONFIGURATION.eager]
+print(f"generate and write: all combinations {full_seconds:.2f}s, serving configuration {serving_seconds:.2f}s")
+print(f"the serving configuration defers {sum(full.build_seconds[c] for c in saved) * 1000:.0f}ms of weighing and "
+      f"{sum(memory[c] for c in saved) / 1e6:.1f}MB of document weights, index file "
+      f"{os.path.getsize(os.path.join(directory, 'full.bin')) / 1e6:.1f}MB down to "
+      f"{os.path.getsize(os.path.join(directory, 'serving.bin')) / 1e6:.1f}MB")
+
+# Reopened from the file, lazy combinations are weighed in memory next to the mapped one
+mapped = DocumentVectorStore(os.path.join(directory, "serving.bin"), configuration=SERVING_CONFIGURATION)
+mapped.load(corpus)
+identical = sum(rankings(full, *combination) == rankings(mapped, *combination) for combination in combinations)
+print(f"mapped serving index: {identical} of {len(combinations)} combinations identical, "
+      f"built on demand {sorted(mapped.built_weights)}")
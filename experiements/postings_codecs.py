@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+
+from engine.InvertedIndex import VEC_TYPES, WORD_TYPES
+from engine.MappedIndex import MappedIndex
+from engine.Search import Search
+from vec.DocumentVectorStore import DocumentVectorStore
+
+search = Search(save_policy="never")
+corpus = search.corpus_manager.get_raw_corpus()
+term_statistics = search.document_vector_store.get_term_statistics(corpus)
+queries = ["final fantasy", "crazy taxi", "james bond", "star wars battlefront", "guitar hero rock",
+           "racing game cars", "sports football soccer", "zombie horror survival", "role playing fantasy adventure"]
+combinations = [(vec_type, word_type) for vec_type in VEC_TYPES for word_type in WORD_TYPES]
+
+
+def rankings(store: DocumentVectorStore) -> list:
+    """Top 10 of every query in every combination, quantized weights can reorder near ties so they are compared"""
+    search.document_vector_store = store
+    search.query_cache.clear()
+    return [[metadata.doc_id for _, metadata, _ in search.search(word_type, vec_type, query, {}, pruned=True)]
+            for vec_type, word_type in combinations for query in queries]
+
+
+reference = None
+directory = tempfile.mkdtemp()
+for codec in [None, "varint", "group-varint", "bitpacked"]:
+    for weight_bits in ([None] if codec is None else [None, 16, 8]):
+        path = os.path.join(directory, f"{codec}-{weight_bits}.bin")
+        MappedIndex.write(path, corpus, term_statistics, codec, weight_bits)
+        index = MappedIndex.open(path)
+
+        document_bytes = weight_bytes = skip_bytes = postings = 0
+        for vec_type in VEC_TYPES:
+            for word_type in WORD_TYPES:
+                name = f"postings/{vec_type}/{word_type}"
+                postings += int(index.array(f"{name}/indptr")[-1])
+                if codec is None:
+                    document_bytes += index.array(f"{name}/indices").nbytes
+                    weight_bytes += index.array(f"{name}/data").nbytes
+                else:
+                    document_bytes += index.array(f"{name}/doc_bytes").nbytes
+                    weight_bytes += index.array(f"{name}/weight_bytes").nbytes
+                    skip_bytes += sum(index.array(f"{name}/{section}").nbytes for section in
+                                      ["block_indptr", "block_last", "block_max", "doc_offsets"])
+
+        start = time.perf_counter()
+        for vec_type in VEC_TYPES:
+            for word_type in WORD_TYPES:
+                index.get_matrix(vec_type, word_type)
+        decode = time.perf_counter() - start
+
+        store = DocumentVectorStore(path, codec, weight_bits)
+        store.load(corpus)
+        ranked = rankings(store)
+        if reference is None:
+            reference = ranked
+        changed = sum(expected != actual for expected, actual in zip(reference, ranked))
+        print(f"{str(codec):>12} {str(weight_bits):>4} bits: doc ids {document_bytes / postings:.2f}, "
+              f"weights {weight_bytes / postings:.2f}, skip data {skip_bytes / postings:.2f} bytes per posting, "
+              f"file {os.path.getsize(path) / 1e6:.2f}MB, decoded {postings / decode / 1e6:.1f}M postings/s, "
+              f"{changed} of {len(ranked)} top 10 rankings changed ({changed / len(ranked):.0%})")
@@ -0,0 +1,32 @@
+import os
+import time
+
+from utils.HTMLExtractor import StreamingExtractor
+from utils.TextProcessor import DocumentProcessor
+
+directory = "./dataset/videogame"
+extractor = StreamingExtractor()
+texts = []
+for filename in sorted(os.listdir(directory)):
+    with open(os.path.join(directory, filename), "rb") as file:
+        elements, raw_output = extractor.extract(file.read())
+    texts.extend(text for text, _ in elements)
+    texts.append(raw_output)
+texts.extend(["Action-Adventure Games", "RPG Games for PlayStation", "Spyder-Man1", "I cannot wanna gonna gimme",
+              "“Final” ‘fantasy’ – «metal» gear — solid"])
+
+# The regex mode has to split every text exactly as nltk does after punctuation is stripped
+mismatches = 0
+for text in texts:
+    expected = DocumentProcessor.tokenise(text, "nltk")
+    actual = DocumentProcessor.tokenise(text, "regex")
+    if expected != actual:
+        mismatches += 1
+        if mismatches <= 10:
+            print(f"differs on {text[:80]!r}: {expected[:20]} {actual[:20]}")
+print(f"{len(texts) - mismatches} of {len(texts)} texts tokenised identically")
+
+for tokenizer in DocumentProcessor.TOKENIZERS:
+    start = time.perf_counter()
+    tokens = sum(len(DocumentProcessor.tokenise(text, tokenizer)) for text in texts)
+    print(f"{tokenizer}: {tokens} tokens in {time.perf_counter() - start:.2f}s")
@@ -1,18 +1,19 @@
+import argparse
 import os
 import re
+import sys
 import threading
+import time
 import tkinter as tk
 import webbrowser
 from pathlib import Path
 from tkinter import font as tkFont
 
+_started = time.perf_counter()
 import ttkbootstrap as ttk
-from PIL import Image, ImageTk
 from ttkbootstrap.constants import *
 from ttkbootstrap.scrolled import ScrolledFrame
-
-from engine.Search import Search
-from utils.SpellChecker import SpellChecker
+_gui_import_seconds = time.perf_counter() - _started
 
 
 class SearchApp:
@@ -24,6 +25,9 @@ class SearchApp:
         self.master = master
         master.title('Search Engine')
 
+        # The engine is imported once the window exists, so its start up cost is not paid before the GUI is shown
+        from engine.Search import Search
+        from utils.SpellChecker import SpellChecker
         self.search = Search()
         self.named_entites = self.search.ner_words
         self.spell_checker = SpellChecker(
@@ -113,6 +117,7 @@ class SearchApp:
     def setup_ui(self):
         """Set up the user interface."""
         # Logo setup
+        from PIL import Image, ImageTk
         logo_path = Path(__file__).parent / "./assets/logo.png"
         logo_image = Image.open(logo_path)
         logo_photo = ImageTk.PhotoImage(logo_image)
@@ -319,6 +324,20 @@ class SearchApp:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search engine GUI")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each stage of start up takes instead of opening the GUI")
+    parser.add_argument("--startup-target", type=float, default=None,
+                        help="start up budget in seconds, --profile-startup exits with 1 when it is exceeded")
+    args = parser.parse_args()
+    if args.profile_startup:
+        from utils.StartupProfiler import StartupProfile, profile_startup
+        profile = StartupProfile()
+        profile.add("GUI import", _gui_import_seconds)
+        profile = profile_startup(profile=profile)
+        print(profile.report(args.startup_target))
+        sys.exit(1 if args.startup_target is not None and profile.total_seconds() > args.startup_target else 0)
+
     root = ttk.Window(themename="superhero")
     root.geometry('1300x900')
     app = SearchApp(root)
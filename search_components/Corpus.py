@@ -1,5 +1,6 @@
 import os
 import pickle
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Optional
 
 from engine.VectorSpace import VectorSpace
@@ -7,34 +8,61 @@ from search_components import Document
 from search_components.WordManager import CorpusWordManager
 
 
+_worker_parser = None
+
+
+def _init_parse_worker():
+    """Each ingestion worker builds its parser, stemmer and lemmatizer once"""
+    global _worker_parser
+    from utils.Parser import DocumentParser
+    _worker_parser = DocumentParser()
+
+
+def _parse_in_worker(path: str):
+    return _worker_parser.parse_compact(path)
+
+
 class Corpus:
     """Class representing the entire collection"""
     documents: List[Document]
     word_manager: CorpusWordManager
     vector_space: VectorSpace
+    # Bumped whenever documents change so anything cached against the corpus is invalidated
+    version: int = 0
+    # Ids of deleted documents, they keep their slot until the corpus is compacted
+    deleted: frozenset = frozenset()
+    compaction_ratio = 0.2
 
-    def __init__(self, directory_path: str):
+    def __init__(self, directory_path: str, workers: Optional[int] = None):
         self.documents = []
         self.directory_path = directory_path
-        self._load_documents()
+        self._load_documents(workers)
         self.word_manager = CorpusWordManager(self.documents)
         self.vector_space = VectorSpace(self.word_manager)
 
-    def _load_documents(self):
+    def _load_documents(self, workers: Optional[int] = None):
+        """Parses every file in the directory, fanned out over a process pool when more than one worker is asked for"""
         from utils.Parser import DocumentParser
-        parser = DocumentParser()
         # Check if directory exists
         if not os.path.exists(self.directory_path):
             raise FileNotFoundError(
                 f"The directory {self.directory_path} does not exist"
             )
-        # Iterate over each file in the directory
-        for filename in os.listdir(self.directory_path):
-            filepath = os.path.join(self.directory_path, filename)
-            # Check if it's a file (and not a subdirectory)
-            if os.path.isfile(filepath):
-                doc = parser.parse(filepath)
-                self.documents.append(doc)
+        # Files are taken in name order so serial and parallel builds see the same sequence
+        paths = [os.path.join(self.directory_path, filename) for filename in sorted(os.listdir(self.directory_path))]
+        paths = [path for path in paths if os.path.isfile(path)]
+        if workers is not None and workers > 1:
+            from utils.NormalisationCache import NormalisationCache
+            normalisation_cache = NormalisationCache.get_instance()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker) as executor:
+                for parsed in executor.map(_parse_in_worker, paths, chunksize=8):
+                    self.documents.append(DocumentParser.build_document(parsed))
+                    # Workers fill their own caches, their forms are kept here so they are saved with the index
+                    normalisation_cache.update(parsed.forms)
+        else:
+            parser = DocumentParser()
+            for path in paths:
+                self.documents.append(parser.parse(path))
         self.sort_corpus()
 
     def sort_corpus(self):
@@ -43,23 +71,129 @@ class Corpus:
         )
 
     def get_document_by_id(self, id: int) -> Optional[Document]:
+        """The document with this id, its raw_content is read from the document store the first time it is used"""
+        if id in self.deleted:
+            return None
         return self.documents[id]
 
+    def store_documents(self, path: str = None, compressed: bool = True) -> None:
+        """
+        Moves the text of every live document into one offset indexed file, so neither memory nor the pickled corpus
+        carries it. Documents added or updated since are kept in memory until this is called again. The file is
+        rewritten in place, at the path of the current store unless another is given.
+        """
+        from search_components.DocumentStore import DocumentStore
+        if path is None:
+            path = self._store_path()
+        live = self.live_documents()
+        document_store = DocumentStore.write(path, [document.raw_content for document in live], compressed)
+        for slot, document in enumerate(live):
+            document.release_content(document_store, slot)
+        # Deleted bodies are not written, their old slots would point into the new file
+        for document in self.documents:
+            if document.metadata.doc_id in self.deleted:
+                document.release_content(None, None)
+
+    def has_content_in_memory(self) -> bool:
+        return any(document.has_content_in_memory() for document in self.live_documents())
+
+    def _store_path(self) -> str:
+        for document in self.documents:
+            if document.store is not None:
+                return document.store.path
+        return "./pklfiles/documents.bin"
+
+    def live_documents(self) -> List[Document]:
+        """Documents that have not been deleted"""
+        return [document for document in self.documents if document.metadata.doc_id not in self.deleted]
+
+    def add_document(self, document: Document) -> int:
+        """Indexes a new document under the next free id and updates the corpus statistics"""
+        document.metadata.doc_id = len(self.documents)
+        self.documents.append(document)
+        self.word_manager.add_document(document)
+        self.vector_space.extend(self.word_manager)
+        self.version += 1
+        return document.metadata.doc_id
+
+    def update_document(self, doc_id: int, document: Document) -> None:
+        """Replaces a document in place, its statistics are swapped for the new content"""
+        self._check_live(doc_id)
+        self.word_manager.remove_document(self.documents[doc_id])
+        document.metadata.doc_id = doc_id
+        self.documents[doc_id] = document
+        self.word_manager.add_document(document)
+        self.vector_space.extend(self.word_manager)
+        self.version += 1
+
+    def delete_document(self, doc_id: int) -> None:
+        """Removes a document from the statistics and tombstones its id until the next compaction"""
+        self._check_live(doc_id)
+        self.word_manager.remove_document(self.documents[doc_id])
+        self.deleted = self.deleted | {doc_id}
+        self.version += 1
+
+    def needs_compaction(self) -> bool:
+        return len(self.deleted) > self.compaction_ratio * len(self.documents)
+
+    def compact(self) -> dict[int, int]:
+        """
+        Drops tombstoned documents and renumbers the rest, returns the old to new id mapping. The document store is
+        rewritten without the dropped bodies.
+        """
+        stored = any(document.store is not None for document in self.documents)
+        mapping = {}
+        documents = []
+        for document in self.live_documents():
+            mapping[document.metadata.doc_id] = len(documents)
+            document.metadata.doc_id = len(documents)
+            documents.append(document)
+        self.documents = documents
+        self.word_manager.remap_documents(mapping)
+        self.deleted = frozenset()
+        if stored:
+            self.store_documents()
+        self.version += 1
+        return mapping
+
+    def _check_live(self, doc_id: int) -> None:
+        if not 0 <= doc_id < len(self.documents) or doc_id in self.deleted:
+            raise KeyError(f"No document with id {doc_id}")
+
 
 class CorpusManager:
     """Class representing management of corpus we should only have one hence singleton"""
     _instance: Optional["CorpusManager"] = None
     raw_corpus = None
 
+    path = "./pklfiles/CorpusManager.pkl"
+
     def __init__(self) -> None:
-        from utils.utilities import check_and_overwrite
-        if os.path.exists("./pklfiles/CorpusManager.pkl"):
-            file = open("./pklfiles/CorpusManager.pkl", "rb")
+        from utils.Persistence import Persister
+        if os.path.exists(self.path):
+            file = open(self.path, "rb")
             self.raw_corpus = pickle.load(file).get_raw_corpus()
+            # Corpora pickled before the document store still carry their text
+            if self.raw_corpus.has_content_in_memory():
+                self.raw_corpus.store_documents()
+            else:
+                Persister.get_instance().mark_saved(self.path, self.raw_corpus.version)
 
         else:
-            self.raw_corpus = Corpus("./dataset/videogame")
-            check_and_overwrite("./pklfiles/CorpusManager.pkl", self)
+            from utils.NormalisationCache import NormalisationCache
+            self.raw_corpus = Corpus("./dataset/videogame", workers=os.cpu_count())
+            self.raw_corpus.store_documents()
+            NormalisationCache.get_instance().save()
+
+    def save(self, lock=None) -> "Future":
+        """
+        Snapshots the corpus in the background, skipped under the 'changed' policy if it has not changed. The
+        normalisation cache is saved with it, keeping the forms learned from queries and added documents.
+        """
+        from utils.NormalisationCache import NormalisationCache
+        from utils.Persistence import Persister
+        NormalisationCache.get_instance().save()
+        return Persister.get_instance().save(self.path, self, self.raw_corpus.version, lock)
 
 
     @classmethod
@@ -15,7 +15,35 @@ class DocumentMetaData:
 
 class Document:
     """Document in the collection"""
-    def __init__(self, word_manager: WordManager, metadata: DocumentMetaData, raw_content):
+    positions = None
+    # Once the body has been moved out of memory it is read back from this DocumentStore slot when asked for
+    store = None
+    slot = None
+
+    def __init__(self, word_manager: WordManager, metadata: DocumentMetaData, raw_content, positions=None):
         self.metadata = metadata
         self.word_manager = word_manager
         self.raw_content = raw_content
+        # Token to the positions it was parsed at, used for phrase and proximity queries
+        self.positions = positions
+
+    @property
+    def raw_content(self) -> str:
+        if self.store is not None:
+            return self.store.get(self.slot)
+        return self.__dict__["raw_content"]
+
+    @raw_content.setter
+    def raw_content(self, raw_content: str) -> None:
+        self.__dict__["raw_content"] = raw_content
+        self.store = None
+        self.slot = None
+
+    def has_content_in_memory(self) -> bool:
+        return "raw_content" in self.__dict__
+
+    def release_content(self, store: "DocumentStore", slot: int) -> None:
+        """Drops the in memory body, it is loaded from the store the next time it is read"""
+        self.__dict__.pop("raw_content", None)
+        self.store = store
+        self.slot = slot
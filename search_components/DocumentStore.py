@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+from engine.QueryCache import CacheStats
+from utils.Persistence import replace_atomically
+
+MAGIC = b"SRCHDOC\0"
+FORMAT_VERSION = 1
+# Magic, format version, whether blocks are zlib compressed, documents per block, document count, table offset
+HEADER = struct.Struct("<8sIIIIQ")
+
+
+class DocumentStore:
+    """
+    Raw text of every document in one file, so a document's body is only read when it is shown. Bodies are grouped
+    into blocks of block_size documents, each optionally compressed, and the file ends with an offset table: the byte
+    range of each block and each body's character range inside its decoded block. Recently read bodies are kept in
+    a small LRU cache.
+    """
+
+    def __init__(self, path: str, cache_size: int = 32):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache: OrderedDict[int, str] = OrderedDict()
+        self.stats = CacheStats()
+        # The offset table is read on the first lookup, so unpickling a corpus does not touch the file
+        self.block_offsets = None
+        self.ranges = None
+        self.compressed = True
+        self.block_size = 1
+
+    def _read_table(self) -> None:
+        with open(self.path, "rb") as file:
+            magic, version, compressed, block_size, count, table_offset = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a document store")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{self.path} has document store version {version}, expected {FORMAT_VERSION}")
+            file.seek(table_offset)
+            number_of_blocks = -(-count // block_size)
+            self.block_offsets = np.frombuffer(file.read(8 * (number_of_blocks + 1)), dtype="<i8")
+            self.ranges = np.frombuffer(file.read(16 * count), dtype="<i8").reshape(count, 2)
+        self.compressed = bool(compressed)
+        self.block_size = block_size
+
+    @classmethod
+    def write(cls, path: str, bodies: List[str], compressed: bool = True, block_size: int = 16) -> "DocumentStore":
+        """Writes the bodies in slot order, to a temporary file that is renamed over path once complete"""
+        temp_path = f"{path}.tmp"
+        block_offsets = [HEADER.size]
+        ranges = []
+        with open(temp_path, "wb") as file:
+            file.write(bytes(HEADER.size))
+            for start in range(0, len(bodies), block_size):
+                length = 0
+                for body in bodies[start:start + block_size]:
+                    ranges.append((length, length + len(body)))
+                    length += len(body)
+                data = "".join(bodies[start:start + block_size]).encode("utf-8")
+                file.write(zlib.compress(data) if compressed else data)
+                block_offsets.append(file.tell())
+            table_offset = file.tell()
+            file.write(np.array(block_offsets, dtype="<i8").tobytes())
+            file.write(np.array(ranges, dtype="<i8").reshape(len(ranges), 2).tobytes())
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, int(compressed), block_size, len(bodies), table_offset))
+        replace_atomically(temp_path, path)
+        return cls(path)
+
+    def get(self, slot: int) -> str:
+        body = self.cache.get(slot)
+        if body is not None:
+            self.cache.move_to_end(slot)
+            self.stats.hits += 1
+            return body
+
+        self.stats.misses += 1
+        if self.ranges is None:
+            self._read_table()
+        block = slot // self.block_size
+        with open(self.path, "rb") as file:
+            file.seek(self.block_offsets[block])
+            data = file.read(self.block_offsets[block + 1] - self.block_offsets[block])
+        start, end = self.ranges[slot]
+        body = (zlib.decompress(data) if self.compressed else data).decode("utf-8")[start:end]
+        self.cache[slot] = body
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+            self.stats.evictions += 1
+        return body
+
+    def __len__(self) -> int:
+        if self.ranges is None:
+            self._read_table()
+        return len(self.ranges)
+
+    def __getstate__(self) -> dict:
+        """Only the path is pickled with the corpus, the offset table is read back from the file"""
+        return {"path": self.path, "cache_size": self.cache_size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"], state["cache_size"])
@@ -1,18 +1,21 @@
-import spacy
 from pygtrie import CharTrie
 
 from search_components.Corpus import Corpus
 from search_components.Word import NamedEntityWord
-from utils.utilities import check_and_overwrite, load
+from utils.Persistence import Persister
+from utils.utilities import load
 
 
 class NamedEntityRecogniser:
     tree = None
+    entity_postings = None
 
     def __init__(self, corpus: Corpus) -> None:
         self.tree = load("./pklfiles/ner.pkl")
         if self.tree is None:
             self.tree = CharTrie()
+            # spaCy and its model take seconds to load, so they are only imported when the trie has to be rebuilt
+            import spacy
             nlp = spacy.load('en_core_web_sm')
             for docs in corpus.documents:
                 doc = nlp(docs.raw_content)
@@ -21,7 +24,25 @@ class NamedEntityRecogniser:
                     ner_word = NamedEntityWord(f"{entity.text}, {entity.label_}", entity.label_)
                     docs.word_manager.add_word(ner_word)
                     corpus.word_manager.add_word(ner_word)
-            check_and_overwrite("./pklfiles/ner.pkl", self.tree)
+            # The entities are now part of the documents, so the corpus has to be saved again
+            corpus.version += 1
+            Persister.get_instance().save("./pklfiles/ner.pkl", self.tree)
+        self.entity_postings = self._build_entity_postings(corpus)
+
+    @staticmethod
+    def _build_entity_postings(corpus: Corpus) -> dict[tuple[str, str], set[int]]:
+        """(entity text, label) to the ids of the documents holding that entity, built once per corpus"""
+        postings = {}
+        for document in corpus.live_documents():
+            for word in document.word_manager.words["original"].values():
+                if isinstance(word, NamedEntityWord):
+                    text = word.original.removesuffix(f", {word.type}")
+                    postings.setdefault((text, word.type), set()).add(document.metadata.doc_id)
+        return postings
+
+    def get_entity_documents(self, ner_words) -> list[set[int]]:
+        """Document sets for the entities selected by the user, one per entity"""
+        return [self.entity_postings.get((text, label), set()) for text, label in ner_words.values()]
 
     def find_words_with_prefix(self, prefix):
         out = []
@@ -1,6 +1,12 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from typing import Optional, override
-from nltk import PorterStemmer, WordNetLemmatizer
+from typing import TYPE_CHECKING, Optional, override
+
+from utils.NormalisationCache import NormalisationCache
+
+if TYPE_CHECKING:
+    from nltk import PorterStemmer, WordNetLemmatizer
 
 
 class IWord(ABC):
@@ -11,6 +17,11 @@ class IWord(ABC):
         self.stemmed = None
         self.lemmatized = None
         self.tag = tag
+        self.normalise(word, stemmer, lemmer)
+
+    def normalise(self, word: str, stemmer: Optional[PorterStemmer] = None,
+                  lemmer: Optional[WordNetLemmatizer] = None) -> None:
+        """Fills in the stemmed and lemmatized forms of the word"""
         self.stem_word(word, stemmer)
         self.lemmatize_word(word, lemmer)
 
@@ -28,18 +39,37 @@ class Word(IWord):
     """Default word implementation"""
     def __init__(self, word: str, tag: str, stemmer: Optional[PorterStemmer] = None,
                  lemmer: Optional[WordNetLemmatizer] = None):
-        super().__init__(word, tag)
+        super().__init__(word, tag, stemmer, lemmer)
         self.lemmatized_concurrent = set()
 
+    @classmethod
+    def from_forms(cls, original: str, stemmed: str, lemmatized: str, tag) -> "Word":
+        """Builds a word whose stemmed and lemmatized forms were already computed, e.g. by an ingestion worker"""
+        word = cls.__new__(cls)
+        word.original = original
+        word.stemmed = stemmed
+        word.lemmatized = lemmatized
+        word.tag = tag
+        word.lemmatized_concurrent = set()
+        return word
+
+    @override
+    def normalise(self, word: str, stemmer: Optional[PorterStemmer] = None,
+                  lemmer: Optional[WordNetLemmatizer] = None) -> None:
+        """Forms come from the shared cache, the stemmer and lemmatizer only run the first time a token is seen"""
+        self.stemmed, self.lemmatized = NormalisationCache.get_instance().normalise(word, stemmer, lemmer)
+
     @override
     def stem_word(self, word: str, stemmer: PorterStemmer = None):
         if stemmer is None:
+            from nltk import PorterStemmer
             stemmer = PorterStemmer()
         self.stemmed = stemmer.stem(word)
 
     @override
     def lemmatize_word(self, word: str, lemmer: WordNetLemmatizer = None) -> str:
         if lemmer is None:
+            from nltk import WordNetLemmatizer
             lemmer = WordNetLemmatizer()
         self.lemmatized = lemmer.lemmatize(word)
 
@@ -52,7 +82,7 @@ class Word(IWord):
 class QueryWord(Word):
     """word provided by a user, has different tag"""
     def __init__(self, word: str, stemmer: PorterStemmer = None, lemmer: WordNetLemmatizer = None):
-        super().__init__(word, tag="query")
+        super().__init__(word, "query", stemmer, lemmer)
 
 
 class NamedEntityWord(IWord):
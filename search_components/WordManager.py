@@ -30,6 +30,24 @@ class WordManager:
                     self.words_by_tag.setdefault(word_type, {}).setdefault(word_form, {}).setdefault(tag, 0)
                     self.words_by_tag[word_type][word_form][tag] += 1
 
+    def remove_word(self, word: Type[Word]) -> None:
+        """Undo add_word, forms whose tag counts all reach zero are dropped"""
+        word_types = [('original', word.original), ('stemmed', word.stemmed), ('lemmatized', word.lemmatized)]
+        tags = [word.tag] if isinstance(word, NamedEntityWord) else word.tag
+
+        for word_type, word_form in word_types:
+            tag_counts = self.words_by_tag.get(word_type, {}).get(word_form)
+            if tag_counts is None:
+                continue
+            for tag in tags:
+                if tag in tag_counts:
+                    tag_counts[tag] -= 1
+                    if tag_counts[tag] == 0:
+                        del tag_counts[tag]
+            if len(tag_counts) == 0:
+                del self.words_by_tag[word_type][word_form]
+                self.words[word_type].pop(word_form, None)
+
     def get_tag_and_count(self, word_type: str, word: str) -> List[Tuple[str, int]]:
         """
         Returns a list of tuples containing (tag, count) for the specified word_type and word.
@@ -74,62 +92,111 @@ class CorpusWordManager(WordManager):
 
     def from_document_managers(self, doc_managers_list):
         for document in doc_managers_list:
-            self.number_of_documents += 1
-            seen = {"original": set(), "stemmed": set(), "lemmatized": set()}
-
-            for word in document.word_manager.words["original"].values():
-                self.add_word(word)
-                # Mark the word as seen in this document
-                seen["original"].add(word.original)
-                seen["stemmed"].add(word.stemmed)
-                seen["lemmatized"].add(word.lemmatized)
-
-            # Update document counts for each word type
-            for word_type in ["original", "stemmed", "lemmatized"]:
-                for word in seen[word_type]:
-                    self.count[word_type][word] = self.count[word_type].get(word, 0) + 1
-                    doc_set = self.docs_holding_word[word_type].get(word, set())
-                    doc_set.add(document.metadata.doc_id)
-                    self.docs_holding_word[word_type][word] = doc_set
-
-    def generate_word_matrix(self, matrix):
-        self.word_matrix = matrix
+            self._add_document_words(document)
 
-    def generate_concurrent_words(self):
-        lemmatized_keys = list(self.word_matrix.keys())
+    def add_document(self, document) -> None:
+        """Adds a single document to the corpus statistics, keeping the average document length current"""
+        self._add_document_words(document)
+        self._avg_doc_length()
 
-        for i, check_word in enumerate(lemmatized_keys):
-            current_word = self.get_word("lemmatized", check_word)
-            heap = []
+    def remove_document(self, document) -> None:
+        """Takes a document's words back out of the corpus statistics"""
+        self.number_of_documents -= 1
+        for word in document.word_manager.words["original"].values():
+            self.remove_word(word)
+
+        for word_type, forms in self._document_forms(document).items():
+            for word in forms:
+                self.count[word_type][word] -= 1
+                self.docs_holding_word[word_type][word].discard(document.metadata.doc_id)
+                if self.count[word_type][word] == 0:
+                    del self.count[word_type][word]
+                    del self.docs_holding_word[word_type][word]
+        self._avg_doc_length()
 
-            # Start the inner loop from the key ahead of the current key
-            for j in range(i + 1, len(lemmatized_keys)):
-                word = lemmatized_keys[j]
+    def _add_document_words(self, document) -> None:
+        self.number_of_documents += 1
+        for word in document.word_manager.words["original"].values():
+            self.add_word(word)
+
+        # Update document counts for each word type
+        for word_type, forms in self._document_forms(document).items():
+            for word in forms:
+                self.count[word_type][word] = self.count[word_type].get(word, 0) + 1
+                doc_set = self.docs_holding_word[word_type].get(word, set())
+                doc_set.add(document.metadata.doc_id)
+                self.docs_holding_word[word_type][word] = doc_set
+
+    @staticmethod
+    def _document_forms(document) -> Dict[str, set]:
+        """
+        Distinct forms of a document's words. Named entities are kept out of the document frequencies: they are
+        added to documents after the corpus statistics are first counted, so the stored corpus has never counted them
+        and counting them here would make removing a document undo counts that were never made.
+        """
+        seen = {"original": set(), "stemmed": set(), "lemmatized": set()}
+        for word in document.word_manager.words["original"].values():
+            if isinstance(word, NamedEntityWord):
+                continue
+            # Mark the word as seen in this document
+            seen["original"].add(word.original)
+            seen["stemmed"].add(word.stemmed)
+            seen["lemmatized"].add(word.lemmatized)
+        return seen
+
+    def remap_documents(self, mapping: Dict[int, int]) -> None:
+        """Renumbers the documents holding each word after the corpus has been compacted"""
+        for word_type in self.docs_holding_word:
+            for word, doc_set in self.docs_holding_word[word_type].items():
+                self.docs_holding_word[word_type][word] = {mapping[doc_id] for doc_id in doc_set}
+
+    def generate_word_matrix(self, matrix: "WordMatrix"):
+        self.word_matrix = matrix
 
-                co_correntdocs = set(self.word_matrix[check_word]).union(
-                    self.word_matrix[word])
-                count = 0
-                sum = 0  # Reset sum for each word
-                for co_occurring in co_correntdocs:
-                    original_word = self.word_matrix[check_word].get(co_occurring, 0)
-                    compare_word = self.word_matrix[word].get(co_occurring, 0)
-                    sum += original_word * compare_word
+    def generate_concurrent_words(self, neighbours: int = 2, block_size: int = 256):
+        """
+        Links each lemmatized word to the later words it shares the most weight with across more than 3 documents.
+        Weight sums and shared document counts come from sparse products of block_size word rows against the whole
+        matrix, so memory grows with the block rather than the vocabulary squared.
+        """
+        import numpy as np
+        words = self.word_matrix.words
+        weights = self.word_matrix.matrix.tocsr()
+        present = weights.copy()
+        present.data = (present.data > 0).astype(np.float64)
+        weights_transposed = weights.T.tocsr()
+        present_transposed = present.T.tocsr()
+
+        for start in range(0, len(words), block_size):
+            end = min(start + block_size, len(words))
+            sums = (weights[start:end] @ weights_transposed).toarray()
+            counts = (present[start:end] @ present_transposed).toarray()
+            for row in range(end - start):
+                # Only words after this one are compared, as the pairwise loop this replaces did
+                later = start + row + 1
+                later_sums = sums[row, later:]
+                candidates = np.flatnonzero((later_sums > 0) & (counts[row, later:] > 3))
+                if len(candidates) == 0:
+                    continue
+                if len(candidates) > neighbours:
+                    # Keep everything tied with the last neighbour's sum so ties are still broken by the word
+                    cutoff = np.partition(later_sums[candidates], -neighbours)[-neighbours]
+                    candidates = candidates[later_sums[candidates] >= cutoff]
+                current_word = self.get_word("lemmatized", words[start + row])
+                for _, word in heapq.nlargest(neighbours, ((later_sums[j], words[later + j]) for j in candidates)):
+                    current_word.add_coccurrent(word)
 
-                    if original_word > 0 and compare_word > 0:
-                        count = count + 1
-                if sum > 0 and count > 3:
-                    heapq.heappush(heap, (sum, word))
+    def _avg_doc_length(self):
+        count = sum(self.count["original"].values())
+        self.avg_doc_length = count / self.number_of_documents if self.number_of_documents > 0 else 0
 
-                while len(heap) > 2:
-                    heapq.heappop(heap)
 
-            while len(heap) != 0:
-                ele = heapq.heappop(heap)
-                current_word.add_coccurrent(ele[1])
+class WordMatrix:
+    """Lemmatized word by document weights, one sparse row per word in the order the corpus first saw the words"""
 
-    def _avg_doc_length(self):
-        count = sum(self.count["original"].values())
-        self.avg_doc_length = count / self.number_of_documents
+    def __init__(self, words: List[str], matrix: "csr_matrix"):
+        self.words = words
+        self.matrix = matrix
 
 
 class QueryManager:
@@ -0,0 +1,323 @@
+import re
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+from bs4.dammit import EntitySubstitution, UnicodeDammit
+
+ElementTexts = List[Tuple[str, List[str]]]
+
+# Removed from every page before its text is read
+REMOVED_TAGS = ("script", "img", "style")
+REMOVED_IDS = ("footer", "menuLeft", "headerSearch")
+
+
+class HTMLExtractor(ABC):
+    """
+    Interface for pulling the indexed text out of a page.
+    """
+
+    @abstractmethod
+    def extract(self, markup: bytes) -> Tuple[ElementTexts, str]:
+        """
+        Returns (text, class list) for every meta tag then for the content div and each leaf element inside it, and
+        the plain text of the content div.
+        """
+        pass
+
+
+class SoupExtractor(HTMLExtractor):
+    """Builds the whole BeautifulSoup tree and walks it, the reference the faster backends are checked against"""
+
+    def extract(self, markup: bytes) -> Tuple[ElementTexts, str]:
+        raw_content = BeautifulSoup(markup, features="html.parser")
+        content = raw_content.find("div", id="content")
+        if content is None:
+            raise ValueError("The page has no content div")
+        raw_output = content.get_text(separator=" ", strip=True)
+        for ele in raw_content(list(REMOVED_TAGS)):
+            ele.extract()
+
+        for comment in raw_content.find_all(string=lambda text: isinstance(text, Comment)):
+            comment.extract()
+
+        for element_id in REMOVED_IDS:
+            for ele in raw_content.select(f"#{element_id}"):
+                ele.extract()
+
+        return self.get_element_texts(raw_content), raw_output
+
+    @staticmethod
+    def get_element_texts(element) -> ElementTexts:
+        output = []
+
+        # Process meta tags
+        meta_tags = element.find_all("meta")
+        for ele in meta_tags:
+            if ele is not None:
+                content = ele.get('content')
+                output.append((content, ["meta"]))
+
+        # Process div elements with id="content" and their children
+        divs = element.find_all("div", id="content")
+        for div in divs:
+            # Process the div itself, extracting direct text
+            div_class = div.get('class') or ["div"]
+            div_text = ''.join(child.string for child in div if isinstance(child, NavigableString))
+            if div_text:
+                output.append((div_text, div_class))
+
+            # Recursively process each child within the div
+            for child in div.findChildren(recursive=False):
+                output.extend(SoupExtractor.process_children(child))
+
+        return output
+
+    @staticmethod
+    def process_children(element) -> ElementTexts:
+        # This function processes an element and its children recursively
+        output = []
+        children = element.findChildren(recursive=False)
+
+        if not children:
+            # If there are no children, this is a leaf node so get it's text
+            element_class = element.get('class') or [element.name]
+            element_text = element.get_text(separator=' ')
+            output.append((element_text, element_class))
+        else:
+            # there are children process them
+            for child in children:
+                output.extend(SoupExtractor.process_children(child))
+
+        return output
+
+
+class StreamingExtractor(HTMLExtractor):
+    """
+    Reads the page in one pass of the standard library tokenizer and keeps only the open element stack, giving the
+    same output as SoupExtractor without building or re-walking a tree.
+    """
+
+    def extract(self, markup: bytes) -> Tuple[ElementTexts, str]:
+        parser = _ContentParser()
+        parser.feed(UnicodeDammit(markup, is_html=True).unicode_markup)
+        parser.close()
+        return parser.get_element_texts(), parser.get_raw_output()
+
+
+class _Element:
+    """An open element, strings are kept as (text, type) where type is the string container or cdata or other"""
+    __slots__ = ("name", "classes", "container", "removed", "has_children", "strings", "texts")
+
+    def __init__(self, name: str, classes: Optional[List[str]], container: Optional[str], removed: bool):
+        self.name = name
+        self.classes = classes
+        self.container = container
+        self.removed = removed
+        self.has_children = False
+        self.strings = []
+        self.texts = None
+
+
+class _ContentParser(HTMLParser):
+    """
+    Follows the tree building rules BeautifulSoup applies on top of html.parser: end tags close up to the most recent
+    open element of that name and are otherwise ignored, void elements close as they open, and text is split into
+    separate strings at every tag, comment and declaration. Leaf elements hand their text to every content div they
+    are in as they close.
+    """
+    VOID_ELEMENTS = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link",
+                               "menuitem", "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command",
+                               "frame", "image", "isindex", "nextid", "spacer"])
+    PRESERVE_WHITESPACE = frozenset(["pre", "textarea"])
+    STRING_CONTAINERS = frozenset(["rt", "rp", "style", "script", "template"])
+    ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+    NON_WHITESPACE = re.compile(r"\S+")
+    DECIMAL_REFERENCE = re.compile("^([0-9]+)(.*)")
+    HEX_REFERENCE = re.compile("^([0-9a-f]+)(.*)")
+    # String types a div reads with get_text
+    DEFAULT_TYPES = ("", "cdata")
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = [_Element("[document]", None, None, False)]
+        self.open_counts: Dict[str, int] = {}
+        self.preserve_depth = 0
+        self.data = []
+        self.already_closed = []
+        self.metas = []
+        self.content_divs = []
+        self.open_content_divs = []
+        self.raw_div = None
+        self.raw_open = False
+        self.raw_strings = []
+
+    def get_element_texts(self) -> ElementTexts:
+        output = [(content, ["meta"]) for content in self.metas]
+        for div in self.content_divs:
+            output.extend(div.texts)
+        return output
+
+    def get_raw_output(self) -> str:
+        if self.raw_div is None:
+            raise ValueError("The page has no content div")
+        return " ".join(self.raw_strings)
+
+    def handle_starttag(self, tag, attrs, close_void=True):
+        self._end_data()
+        attributes = {}
+        for key, value in attrs:
+            attributes[key] = "" if value is None else value
+        parent = self.stack[-1]
+        removed = parent.removed or tag in REMOVED_TAGS or attributes.get("id") in REMOVED_IDS
+        classes = self.NON_WHITESPACE.findall(attributes["class"]) if "class" in attributes else None
+        container = tag if tag in self.STRING_CONTAINERS else parent.container
+        element = _Element(tag, classes, container, removed)
+        if not removed:
+            parent.has_children = True
+
+        if tag == "div" and attributes.get("id") == "content":
+            # The plain text is read before anything is removed
+            if self.raw_div is None:
+                self.raw_div = element
+                self.raw_open = True
+            if not removed:
+                element.texts = []
+                self.content_divs.append(element)
+                self.open_content_divs.append(element)
+        if tag == "meta" and not removed:
+            self.metas.append(attributes.get("content"))
+
+        self.stack.append(element)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in self.PRESERVE_WHITESPACE:
+            self.preserve_depth += 1
+        if close_void and tag in self.VOID_ELEMENTS:
+            self.handle_endtag(tag, check_already_closed=False)
+            # An explicit end tag may still follow, it is skipped
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, close_void=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        self._end_data()
+        if not self.open_counts.get(tag):
+            return
+        while self._pop().name != tag:
+            pass
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.data.append(character if character is not None else f"&{name}")
+
+    def handle_charref(self, name):
+        base = 10
+        pattern = self.DECIMAL_REFERENCE
+        if name.startswith("x") or name.startswith("X"):
+            name = name[1:]
+            base = 16
+            pattern = self.HEX_REFERENCE
+        number = None
+        extra = ""
+        try:
+            number = int(name, base)
+        except ValueError:
+            # A reference without its semicolon, the digits are the reference and the rest is text
+            match = pattern.search(name)
+            if match is not None:
+                number = int(match.group(1), base)
+                extra = match.group(2)
+        if number is None:
+            self.data.append("")
+            self.data.append(name)
+        else:
+            self.data.append(self._character(number))
+            self.data.append(extra)
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+        self.data.append(decl[len("DOCTYPE "):])
+        self._end_data("other")
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):
+            self.data.append(data[len("CDATA["):])
+            self._end_data("cdata")
+        else:
+            self.data.append(data)
+            self._end_data("other")
+
+    def handle_pi(self, data):
+        self._end_data()
+        self.data.append(data)
+        self._end_data("other")
+
+    def close(self):
+        super().close()
+        self._end_data()
+        while len(self.stack) > 1:
+            self._pop()
+
+    def _end_data(self, string_type: str = None):
+        if not self.data:
+            return
+        text = "".join(self.data)
+        self.data = []
+        if self.preserve_depth == 0 and not text.strip(self.ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        if string_type is None:
+            string_type = self.stack[-1].container or ""
+
+        if self.raw_open and string_type in self.DEFAULT_TYPES:
+            stripped = text.strip()
+            if stripped:
+                self.raw_strings.append(stripped)
+        if not self.stack[-1].removed:
+            self.stack[-1].strings.append((text, string_type))
+
+    def _pop(self) -> _Element:
+        element = self.stack.pop()
+        self.open_counts[element.name] -= 1
+        if element.name in self.PRESERVE_WHITESPACE:
+            self.preserve_depth -= 1
+        if element is self.raw_div:
+            self.raw_open = False
+        if element.removed:
+            return element
+
+        if element.texts is not None:
+            self.open_content_divs.pop()
+            direct_text = "".join(text for text, _ in element.strings)
+            if direct_text:
+                element.texts.insert(0, (direct_text, element.classes or ["div"]))
+        if not element.has_children and self.open_content_divs:
+            types = (element.name,) if element.name in self.STRING_CONTAINERS else self.DEFAULT_TYPES
+            leaf_text = " ".join(text for text, string_type in element.strings if string_type in types)
+            for div in self.open_content_divs:
+                div.texts.append((leaf_text, element.classes or [element.name]))
+        return element
+
+    @staticmethod
+    def _character(number: int) -> str:
+        """The character a numeric reference stands for, C1 controls are read as windows-1252 as browsers do"""
+        if number == 0 or number > 0x10ffff or 0xd800 <= number <= 0xdfff:
+            return "\N{REPLACEMENT CHARACTER}"
+        if 0x80 <= number <= 0x9f:
+            try:
+                return bytes([number]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        return chr(number)
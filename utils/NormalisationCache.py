@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from engine.QueryCache import CacheStats
+
+if TYPE_CHECKING:
+    from nltk import PorterStemmer, WordNetLemmatizer
+
+
+class NormalisationCache:
+    """
+    Bounded LRU map from a token to its (stemmed, lemmatized) forms. One instance is shared by the whole process so
+    ingestion, query processing and the spell checker each stem and lemmatize a distinct token only once.
+    """
+    _instance: Optional["NormalisationCache"] = None
+    path = "./pklfiles/normalisation-cache.pkl"
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self.stats = CacheStats()
+        self.stemmer = None
+        self.lemmatizer = None
+        # Counts the forms added, so a save under the 'changed' policy is skipped when nothing new was learned
+        self.version = 0
+
+    @classmethod
+    def get_instance(cls) -> "NormalisationCache":
+        """The process wide cache, seeded from the copy saved with the index if there is one"""
+        if cls._instance is None:
+            from utils.Persistence import Persister
+            from utils.utilities import load
+            cls._instance = cls()
+            saved = load(cls.path)
+            if saved:
+                cls._instance.update(saved)
+                Persister.get_instance().mark_saved(cls.path, cls._instance.version)
+        return cls._instance
+
+    def normalise(self, token: str, stemmer: PorterStemmer = None,
+                  lemmatizer: WordNetLemmatizer = None) -> tuple[str, str]:
+        forms = self.entries.get(token)
+        if forms is not None:
+            self.entries.move_to_end(token)
+            self.stats.hits += 1
+            return forms
+
+        self.stats.misses += 1
+        # Callers without their own stemmer or lemmatizer share one pair instead of building them per token. NLTK is
+        # imported on the first miss, and WordNet is only read by the first lemmatize call, so a warm cache loads neither
+        if stemmer is None:
+            if self.stemmer is None:
+                from nltk import PorterStemmer
+                self.stemmer = PorterStemmer()
+            stemmer = self.stemmer
+        if lemmatizer is None:
+            if self.lemmatizer is None:
+                from nltk import WordNetLemmatizer
+                self.lemmatizer = WordNetLemmatizer()
+            lemmatizer = self.lemmatizer
+        forms = (stemmer.stem(token), lemmatizer.lemmatize(token))
+        self._put(token, forms)
+        return forms
+
+    def update(self, forms: Iterable[tuple[str, str, str]]) -> None:
+        """Adds (token, stemmed, lemmatized) forms computed elsewhere, e.g. by an ingestion worker"""
+        for token, stemmed, lemmatized in forms:
+            if token not in self.entries:
+                self._put(token, (stemmed, lemmatized))
+
+    def save(self, path: str = None) -> "Future":
+        """
+        Writes the cached forms next to the index in the background so the next build starts warm, under the
+        Persister's policy like the corpus and index saves it accompanies
+        """
+        from utils.Persistence import Persister
+        return Persister.get_instance().save(path or self.path,
+                                             [(token, *forms) for token, forms in self.entries.items()], self.version)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.version += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _put(self, token: str, forms: tuple[str, str]) -> None:
+        if self.max_entries < 1:
+            return
+        self.entries[token] = forms
+        self.version += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
@@ -1,14 +1,14 @@
 import csv
+import os
 from abc import ABC, abstractmethod
-from typing import Any, Optional
-
-from bs4 import BeautifulSoup, Comment, NavigableString
-from nltk import PorterStemmer
-from nltk import WordNetLemmatizer
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
 
 from search_components.Document import Document, DocumentMetaData
 from search_components.Word import Word
 from search_components.WordManager import WordManager
+from utils.HTMLExtractor import HTMLExtractor, StreamingExtractor
+from utils.NormalisationCache import NormalisationCache
 
 
 class IParser(ABC):
@@ -27,6 +27,8 @@ class IParser(ABC):
 class MetadataParser(IParser):
     def __init__(self, csv_path: str = "./dataset/video-game-labels.csv"):
         self.metadata_dict = self.parse(csv_path)
+        # The same entries keyed by absolute path, so a document is found however its path is written
+        self.metadata_by_path = {self.normalise_path(url): meta for url, meta in self.metadata_dict.items()}
 
     def parse(self, data: str) -> dict:
         metadata_dict = dict()
@@ -41,38 +43,88 @@ class MetadataParser(IParser):
                 doc_id += 1
         return metadata_dict
 
-    def get_metadata_for_document(self, doc_url: str) -> DocumentMetaData:
-        # Simply fetch and return the metadata using the URL as the key.
-        if self.metadata_dict.get(doc_url) is None:
-            print(doc_url)
-        else:
-            return self.metadata_dict.get(doc_url)
+    def get_metadata_for_document(self, doc_url: str) -> Optional[DocumentMetaData]:
+        """Metadata of the document at a path, None if the labels file does not list it"""
+        metadata = self.metadata_dict.get(doc_url)
+        if metadata is None:
+            metadata = self.metadata_by_path.get(self.normalise_path(doc_url))
+        return metadata
+
+    @staticmethod
+    def normalise_path(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+
+@dataclass
+class ParsedDocument:
+    """Compact, picklable result of parsing one file, each distinct token is normalised and stored once"""
+    metadata: DocumentMetaData
+    raw_content: str
+    forms: List[Tuple[str, str, str]] = field(default_factory=list)
+    tags: List[Tuple[str, ...]] = field(default_factory=list)
+    # (form index, tags index) for every token in parse order
+    occurrences: List[Tuple[int, int]] = field(default_factory=list)
+    positions: Dict[str, List[int]] = field(default_factory=dict)
 
 
 class DocumentParser(IParser):
-    def __init__(self, metadata_parser: Optional[MetadataParser] = None):
+    def __init__(self, metadata_parser: Optional[MetadataParser] = None, extractor: Optional[HTMLExtractor] = None,
+                 tokenizer: Optional[str] = None):
         if metadata_parser is None:
             self.metadata_parser = MetadataParser()
         else:
             self.metadata_parser = metadata_parser
-
-    def parse(self, path: str, okm25f=True) -> Document:
+        # The streaming backend gives the same output as SoupExtractor in a fraction of the time
+        self.extractor = extractor if extractor is not None else StreamingExtractor()
+        # None follows DocumentProcessor.tokenizer
+        self.tokenizer = tokenizer
+        from nltk import PorterStemmer, WordNetLemmatizer
+        self.stemmer = PorterStemmer()
+        self.lemmar = WordNetLemmatizer()
+
+    def parse(self, path: str, okm25f=True, metadata: Optional[DocumentMetaData] = None) -> Document:
         """
         Reads and parses a document from a given path.
         """
+        return self.build_document(self.parse_compact(path, metadata))
+
+    def parse_compact(self, path: str, metadata: Optional[DocumentMetaData] = None) -> ParsedDocument:
+        """
+        Reads, tokenises and normalises a document without building its word objects, so the result is cheap to send
+        back from a worker process. Metadata is looked up by path unless given, a page the labels file does not list
+        gets metadata holding only its path, and an id of -1 until the corpus assigns one.
+        """
         from utils.TextProcessor import DocumentProcessor
         doc_processor = DocumentProcessor()
         content, raw_content = self._read_html(path)
-        doc_metadata = self._read_metadata(self.metadata_parser, path)
-        word_manager = WordManager()
-        stemmer = PorterStemmer()
-        lemmar = WordNetLemmatizer()
+        doc_metadata = metadata
+        if doc_metadata is None:
+            labelled = self._read_metadata(self.metadata_parser, path)
+            # A copy, the corpus renumbers the metadata of the documents it holds
+            doc_metadata = replace(labelled) if labelled is not None else DocumentMetaData(-1, path, "", "", "", "")
+        parsed = ParsedDocument(doc_metadata, raw_content)
+        normalisation_cache = NormalisationCache.get_instance()
+        form_ids = {}
+        tag_ids = {}
+        position = 0
+
+        def add_tokens(tokens, tags):
+            tag_id = tag_ids.setdefault(tuple(tags), len(tag_ids))
+            if tag_id == len(parsed.tags):
+                parsed.tags.append(tuple(tags))
+            for count, token in enumerate(tokens):
+                if token not in form_ids:
+                    form_ids[token] = len(parsed.forms)
+                    parsed.forms.append((token, *normalisation_cache.normalise(token, self.stemmer, self.lemmar)))
+                parsed.occurrences.append((form_ids[token], tag_id))
+                parsed.positions.setdefault(token, []).append(position + count)
+
         # Process each tag type, tokenize the text and count the word
         for element in content:
-            tokens = doc_processor.tokenise(element[0])
-            for count, token in enumerate(tokens):
-                word = Word(token, element[1], stemmer, lemmar)
-                word_manager.add_word(word)
+            tokens = doc_processor.tokenise(element[0], self.tokenizer)
+            add_tokens(tokens, element[1])
+            # Leave a gap so a phrase cannot match across two elements
+            position += len(tokens) + 1
 
         metadata_attributes = [
             doc_metadata.url,
@@ -84,86 +136,34 @@ class DocumentParser(IParser):
         for attribute in metadata_attributes:
             attribute = attribute.replace("/", " ")
             attribute = attribute.replace(".", " ")
-            tokens = doc_processor.tokenise(attribute)
-            for token in tokens:
-                word = Word(token, ["metadata"], stemmer, lemmar)
-                word_manager.add_word(word)
-        return Document(word_manager, doc_metadata, raw_content)
+            tokens = doc_processor.tokenise(attribute, self.tokenizer)
+            add_tokens(tokens, ["metadata"])
+            position += len(tokens) + 1
+        return parsed
 
     @staticmethod
-    def _read_metadata(metadata_parser: MetadataParser, path):
-        return metadata_parser.get_metadata_for_document(path)
-
-    @staticmethod
-    def get_element_texts(element):
-        output = []
-
-        # Process meta tags
-        meta_tags = element.find_all("meta")
-        for ele in meta_tags:
-            if ele is not None:
-                content = ele.get('content')
-                output.append((content, ["meta"]))
-
-        # Process div elements with id="content" and their children
-        divs = element.find_all("div", id="content")
-        for div in divs:
-            # Process the div itself, extracting direct text
-            div_class = div.get('class') or ["div"]
-            div_text = ''.join(child.string for child in div if isinstance(child, NavigableString))
-            if div_text:
-                output.append((div_text, div_class))
-
-            # Recursively process each child within the div
-            for child in div.findChildren(recursive=False):
-                output.extend(DocumentParser.process_children(child))
-
-        return output
+    def build_document(parsed: ParsedDocument) -> Document:
+        """Replays the parsed tokens in order into a word manager, giving the same counts as adding each word"""
+        word_manager = WordManager()
+        words = {}
+        for occurrence in parsed.occurrences:
+            if occurrence not in words:
+                original, stemmed, lemmatized = parsed.forms[occurrence[0]]
+                words[occurrence] = Word.from_forms(original, stemmed, lemmatized, list(parsed.tags[occurrence[1]]))
+            word_manager.add_word(words[occurrence])
+        return Document(word_manager, parsed.metadata, parsed.raw_content, parsed.positions)
 
     @staticmethod
-    def process_children(element):
-        # This function processes an element and its children recursively
-        output = []
-        children = element.findChildren(recursive=False)
-
-        if not children:
-            # If there are no children, this is a leaf node so get it's text
-            element_class = element.get('class') or [element.name]
-            element_text = element.get_text(separator=' ')
-            output.append((element_text, element_class))
-        else:
-            # there are children process them
-            for child in children:
-                output.extend(DocumentParser.process_children(child))
-
-        return output
+    def _read_metadata(metadata_parser: MetadataParser, path):
+        return metadata_parser.get_metadata_for_document(path)
 
-    @staticmethod
-    def _read_html(path: str):
+    def _read_html(self, path: str):
         """
         Reads the content from the given path and returns the raw and text content, removes fields that are not required
         """
         try:
             with open(path, "rb") as f:
-                raw_content = BeautifulSoup(f.read(), features="html.parser")
-                raw_output = raw_content.find("div", id="content").get_text(separator=" ", strip=True)
-                for ele in raw_content(["script", "img", "style"]):
-                    ele.extract()
-
-                for comment in raw_content.find_all(string=lambda text: isinstance(text, Comment)):
-                    comment.extract()
-
-                for ele in raw_content.select("#footer"):
-                    ele.extract()
-
-                for ele in raw_content.select("#menuLeft"):
-                    ele.extract()
-
-                for ele in raw_content.select("#headerSearch"):
-                    ele.extract()
-
-                output = DocumentParser.get_element_texts(raw_content)
-                return output, raw_output
+                return self.extractor.extract(f.read())
 
         except FileNotFoundError:
             raise FileNotFoundError(f"The directory {path} does not exist")
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+SAVE_POLICIES = ("never", "always", "changed")
+
+
+@dataclass
+class SaveReport:
+    """Outcome of one save, the times are spent on the background thread rather than by the caller"""
+    path: str
+    saved: bool
+    serialise_seconds: float = 0
+    write_seconds: float = 0
+    size: int = 0
+
+    def total_seconds(self) -> float:
+        return self.serialise_seconds + self.write_seconds
+
+
+class Persister:
+    """
+    Saves snapshots of index state without blocking the caller. Each save is pickled and written on a single
+    background thread, to a temporary file that is fsynced and renamed over the target, so a crash leaves either the
+    old file or the new one. The policy decides whether to write never, always, or only when the version passed with
+    the object differs from the one last saved or loaded for that path.
+    """
+    _instance: Optional["Persister"] = None
+
+    def __init__(self, policy: str = "changed", verbose: bool = True):
+        self.policy = None
+        self.set_policy(policy)
+        self.verbose = verbose
+        self.saved_versions: Dict[str, object] = {}
+        self.reports: List[SaveReport] = []
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persister")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "Persister":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def set_policy(self, policy: str) -> None:
+        if policy not in SAVE_POLICIES:
+            raise ValueError(f"Invalid save policy {policy}. Choose from 'never', 'always' or 'changed'.")
+        self.policy = policy
+
+    def mark_saved(self, path: str, version) -> None:
+        """Records the version of what is on disk at path, e.g. after loading it, so an unchanged copy is not saved"""
+        with self._lock:
+            self.saved_versions[path] = version
+
+    def save(self, path: str, obj: object, version=None, lock=None) -> Future:
+        """
+        Queues a snapshot of obj and returns a future of its SaveReport. With the 'changed' policy an object saved
+        without a version is always written. The lock, if given, is held while obj is pickled so a caller can keep
+        it consistent while other threads change it.
+        """
+        future = Future()
+        with self._lock:
+            skip = self.policy == "never" or (self.policy == "changed" and version is not None
+                                              and self.saved_versions.get(path) == version and os.path.exists(path))
+            if not skip:
+                self.saved_versions[path] = version
+        if skip:
+            report = SaveReport(path, False)
+            self.reports.append(report)
+            future.set_result(report)
+            return future
+        return self.executor.submit(self._save, path, obj, lock)
+
+    def wait(self) -> List[SaveReport]:
+        """Blocks until every queued save has been written, returns the reports so far"""
+        self.executor.submit(lambda: None).result()
+        return list(self.reports)
+
+    def _save(self, path: str, obj: object, lock) -> SaveReport:
+        started = time.perf_counter()
+        try:
+            with lock if lock is not None else nullcontext():
+                data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            serialised = time.perf_counter()
+
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            replace_atomically(temp_path, path)
+        except Exception as e:
+            # Nothing was saved, so the next save of this path is written whatever its version
+            with self._lock:
+                self.saved_versions.pop(path, None)
+            print(f"Saving '{path}' failed: {e}")
+            raise
+        report = SaveReport(path, True, serialised - started, time.perf_counter() - serialised, len(data))
+        self.reports.append(report)
+        if self.verbose:
+            print(f"Data saved to '{path}' ({report.size} bytes) in {report.total_seconds():.2f}s.")
+        return report
+
+
+def replace_atomically(temp_path: str, path: str) -> None:
+    """Flushes a finished temporary file to disk and renames it over path, readers see the old file or the new one"""
+    with open(temp_path, "rb+") as file:
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    # The rename itself is only durable once the directory entry is flushed
+    if hasattr(os, "O_DIRECTORY"):
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import importlib
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Dependencies that dominate cold start when imported, they should only be loaded by the stage that needs them
+HEAVY_MODULES = ("nltk", "spacy", "scipy", "ttkbootstrap", "PIL")
+
+
+@dataclass
+class StartupProfile:
+    """Seconds spent in each stage of bringing up a Search, in the order they ran"""
+    stages: List[Tuple[str, float]] = field(default_factory=list)
+    # Heavy modules imported by the end of each stage
+    loaded: List[Tuple[str, List[str]]] = field(default_factory=list)
+    # A query once everything is warm, for comparison, it is not part of start up
+    warm_query_seconds: float = 0
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages.append((stage, seconds))
+        self.loaded.append((stage, [module for module in HEAVY_MODULES if module in sys.modules]))
+
+    def total_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.stages)
+
+    def report(self, target_seconds: Optional[float] = None) -> str:
+        lines = []
+        seen = []
+        for (stage, seconds), (_, loaded) in zip(self.stages, self.loaded):
+            new = [module for module in loaded if module not in seen]
+            seen.extend(new)
+            lines.append(f"{stage:<22}{seconds * 1000:>10.1f} ms" + (f"  loaded {', '.join(new)}" if new else ""))
+        lines.append(f"{'total':<22}{self.total_seconds() * 1000:>10.1f} ms")
+        lines.append(f"{'(warm query)':<22}{self.warm_query_seconds * 1000:>10.1f} ms")
+        if target_seconds is not None:
+            verdict = "within" if self.total_seconds() <= target_seconds else "over"
+            lines.append(f"{verdict} the {target_seconds * 1000:.0f} ms start up target")
+        return "\n".join(lines)
+
+
+def profile_startup(query: str = "final fantasy", word_type: str = "lemmatized",
+                    vec_type: str = "BM25plusFieldVector", profile: StartupProfile = None) -> StartupProfile:
+    """
+    Times a cold start in this process: importing the engine, loading the corpus, the NER trie and the index, then a
+    first query, which warms the normalisation cache and index pages. A second query is timed for comparison. Only
+    meaningful before engine.Search has been imported, a profile may be passed in with earlier stages already recorded.
+    """
+    profile = profile if profile is not None else StartupProfile()
+    started = time.perf_counter()
+    search_module = importlib.import_module("engine.Search")
+    profile.add("import", time.perf_counter() - started)
+
+    search = search_module.Search(save_policy="never")
+    for stage, seconds in search.startup_timings.items():
+        profile.add(stage, seconds)
+
+    started = time.perf_counter()
+    search.search(word_type, vec_type, query, {}, pruned=True)
+    profile.add("first query warmup", time.perf_counter() - started)
+
+    search.query_cache.clear()
+    started = time.perf_counter()
+    search.search(word_type, vec_type, query, {}, pruned=True)
+    profile.warm_query_seconds = time.perf_counter() - started
+    return profile
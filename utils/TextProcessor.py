@@ -1,23 +1,42 @@
+import re
 import string
-from typing import List
+from typing import List, Optional
 
-from nltk import word_tokenize
+PUNCTUATION_TRANSLATOR = str.maketrans('', '', string.punctuation)
+# The nltk word_tokenize rules that can still fire once ASCII punctuation is gone: unicode quotes and dashes are split
+# off and the MacIntyre contractions without an apostrophe are split in two, wanna only when followed by a space
+TOKEN_BOUNDARIES = re.compile(
+    r"(?i)([«“‘„»”’\u2012-\u2015])|\b(can)(not)\b|\b(gim)(me)\b|\b(gon)(na)\b|\b(got)(ta)\b|\b(lem)(me)\b"
+    r"|\b(wan)(na)(?=[\s«“‘„»”’\u2012-\u2015]|$)")
+TOKEN_BOUNDARY_SPACING = r" \1 \2\4\6\8\10\12 \3\5\7\9\11\13 "
 
 
 class DocumentProcessor:
     """Class for various textual processing methods"""
+    TOKENIZERS = ("regex", "nltk")
+    # Both modes give the same tokens, regex skips sentence splitting and loading nltk
+    tokenizer = "regex"
+
     @staticmethod
     def remove_punctuation(text: str) -> str:
         """Remove punctuation - are spaces due to urls and all other punc is '' """
         text = text.replace('-', ' ')
-        translator = str.maketrans('', '', string.punctuation)
-        return text.translate(translator)
+        return text.translate(PUNCTUATION_TRANSLATOR)
 
     @staticmethod
-    def tokenise(text: str) -> List[str]:
+    def tokenise(text: str, tokenizer: Optional[str] = None) -> List[str]:
         """
-        Tokenises the input text and returns a list of tokens.
+        Tokenises the input text and returns a list of tokens, with the given tokenizer mode or the class default.
         """
+        if tokenizer is None:
+            tokenizer = DocumentProcessor.tokenizer
         text_no_punc = DocumentProcessor.remove_punctuation(text)
-        lowercase_tokens = [token.casefold() for token in word_tokenize(text_no_punc) if text_no_punc is not None]
+        if tokenizer == "regex":
+            tokens = TOKEN_BOUNDARIES.sub(TOKEN_BOUNDARY_SPACING, text_no_punc).split()
+        elif tokenizer == "nltk":
+            from nltk import word_tokenize
+            tokens = word_tokenize(text_no_punc)
+        else:
+            raise ValueError(f"Invalid tokenizer {tokenizer}. Choose from 'regex' or 'nltk'.")
+        lowercase_tokens = [token.casefold() for token in tokens]
         return lowercase_tokens
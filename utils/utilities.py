@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import os
 import pickle
 
 from search_components.Word import QueryWord
@@ -11,11 +10,16 @@ class UserInput:
     """Class that handles turning input into query vector"""
 
     @staticmethod
-    def process_input(input, corpus_word_manager, vector_space, stemmar, lemmar) -> "QueryVector":
+    def process_input(input, corpus_word_manager, vector_space, stemmar, lemmar, tokenizer=None) -> "QueryVector":
         """Tokenises the input and turns into vector representation"""
         from utils.TextProcessor import DocumentProcessor
         dp = DocumentProcessor()
-        tokens = dp.tokenise(input)
+        tokens = dp.tokenise(input, tokenizer)
+        return UserInput.process_tokens(tokens, corpus_word_manager, vector_space, stemmar, lemmar)
+
+    @staticmethod
+    def process_tokens(tokens, corpus_word_manager, vector_space, stemmar, lemmar) -> "QueryVector":
+        """Turns already tokenised input into vector representation"""
         query_word_manager = QueryManager()
         for token in tokens:
             word = QueryWord(token, stemmar, lemmar)
@@ -25,23 +29,23 @@ class UserInput:
         vec = QueryVector(corpus_word_manager, query_word_manager, "query", vector_space)
         return vec
 
+    @staticmethod
+    def process_inputs(inputs, corpus_word_manager, vector_space, stemmar, lemmar,
+                       tokenizer=None) -> list["QueryVector"]:
+        """Tokenises a batch of inputs, each distinct token is stemmed and lemmatized once for the whole batch"""
+        from utils.TextProcessor import DocumentProcessor
+        dp = DocumentProcessor()
+        token_lists = [dp.tokenise(input, tokenizer) for input in inputs]
+        words = {token: QueryWord(token, stemmar, lemmar) for tokens in token_lists for token in tokens}
 
-def check_and_overwrite(string: str, obj: object):
-    """
-    Checks if a file exists, and prompts the user whether to overwrite it or not.
-    If the user chooses to overwrite or the file doesn't exist, it writes the data to the file.
-    """
-    if os.path.exists(string):
-        response = input(f"'{string}' already exists. Do you want to overwrite it? (yes/no): ").lower()
-
-        if response != 'yes':
-            print("Operation aborted by user.")
-            return
-
-    with open(string, 'wb') as file:
-        from pickle import dump
-        dump(obj, file)
-        print(f"Data saved to '{string}.")
+        from vec.Vector import QueryVector
+        vecs = []
+        for tokens in token_lists:
+            query_word_manager = QueryManager()
+            for token in tokens:
+                query_word_manager.add_word(words[token])
+            vecs.append(QueryVector(corpus_word_manager, query_word_manager, "query", vector_space))
+        return vecs
 
 
 def load(url):
@@ -1,7 +1,31 @@
 from __future__ import annotations
-from typing import Type
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Type
 import numpy as np
-from utils.utilities import load, check_and_overwrite
+from engine.InvertedIndex import VEC_TYPES, WORD_TYPES
+from engine.MappedIndex import MappedIndex
+
+
+@dataclass(frozen=True)
+class IndexConfiguration:
+    """
+    (vec_type, word_type) combinations built with the index, by default all twelve. Any other combination is
+    weighed from the term statistics the first time it is queried.
+    """
+    eager: Tuple[Tuple[str, str], ...] = tuple((vec_type, word_type) for vec_type in VEC_TYPES
+                                               for word_type in WORD_TYPES)
+
+    def __post_init__(self):
+        for vec_type, word_type in self.eager:
+            if vec_type not in VEC_TYPES or word_type not in WORD_TYPES:
+                raise ValueError(f"Invalid vector type {vec_type} or word type {word_type}")
+
+
+WEIGHT_DTYPES = ("float32", "float16")
+
+# What the deployed engine serves, lemmatized words weighted with field BM25+
+SERVING_CONFIGURATION = IndexConfiguration((("BM25plusFieldVector", "lemmatized"),))
 
 
 class VectorStore:
@@ -9,6 +33,7 @@ class VectorStore:
     TFIDFField: Type["Vector"]
     BM25Vector: Type["Vector"]
     BM25Field: Type["Vector"]
+    __slots__ = ("TFIDFVector", "TFIDFFieldVector", "BM25plusVector", "BM25plusFieldVector")
 
     def __init__(self, TFIDFVector: Type["Vector"], TFIDFFieldVector: Type["Vector"], BM25plusVector: Type["Vector"],
                  BM25plusFieldVector: Type["Vector"]):
@@ -18,6 +43,56 @@ class VectorStore:
         self.BM25plusFieldVector = BM25plusFieldVector
 
 
+# (starts, term ids, weights) of every document of one combination, document i runs from starts[i] to starts[i + 1]
+WeightArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def term_weights(arrays: WeightArrays, doc_id: int, vector_space, word_type: str) -> "TermWeights":
+    """One document's slice of a combination's weight arrays, the TermWeights are views so nothing is copied"""
+    from vec.Vector import TermWeights
+    starts, terms, weights = arrays
+    start, end = starts[doc_id], starts[doc_id + 1]
+    return TermWeights(terms[start:end], weights[start:end], vector_space, word_type)
+
+
+class MappedVectors:
+    """
+    Document vectors of a memory mapped index, read like the array of VectorStores they replace. A document's
+    vectors are only built from its rows of the index when it is looked up, with the weights of combinations the file
+    does not hold taken from built_weights once they are built.
+    """
+    def __init__(self, mapped_index: MappedIndex, corpus, built_weights: Dict[Tuple[str, str], WeightArrays] = None):
+        self.mapped_index = mapped_index
+        self.corpus = corpus
+        self.metadata = mapped_index.get_metadata()
+        self.built_weights = built_weights if built_weights is not None else {}
+
+    def __len__(self) -> int:
+        return self.mapped_index.document_count
+
+    def __getitem__(self, doc_id: int) -> VectorStore | None:
+        if not self.mapped_index.is_live(doc_id):
+            return None
+        from vec.Vector import DocumentVector, TermWeights
+        vectors = []
+        for vec_type in VEC_TYPES:
+            vector = DocumentVector(self.metadata[doc_id])
+            for word_type in WORD_TYPES:
+                if self.mapped_index.has_combination(vec_type, word_type):
+                    vector.set_weights(word_type, TermWeights(
+                        *self.mapped_index.get_document_arrays(vec_type, word_type, doc_id),
+                        self.corpus.vector_space, word_type))
+                elif (vec_type, word_type) in self.built_weights:
+                    vector.set_weights(word_type, term_weights(self.built_weights[(vec_type, word_type)], doc_id,
+                                                               self.corpus.vector_space, word_type))
+            vectors.append(vector)
+        return VectorStore(*vectors)
+
+    def __iter__(self):
+        for doc_id in range(len(self)):
+            yield self[doc_id]
+
+
 class DocumentVectorStore:
     """
     This class is responsible for generating and storing vectors for each document.
@@ -25,47 +100,197 @@ class DocumentVectorStore:
     the vector representations.
     """
 
-    def __init__(self):
-        self.need_vector_generation = False
-        self.document_vectors = load("./pklfiles/document-vectors.pkl")
-        if self.document_vectors is None:
-            self.need_vector_generation = True
-            self.document_vectors = np.empty(399, dtype=object)
+    def __init__(self, index_path: str = "./pklfiles/index.bin", codec: str = None, weight_bits: int = None,
+                 configuration: IndexConfiguration = None, weight_dtype: str = "float32"):
+        if weight_dtype not in WEIGHT_DTYPES:
+            raise ValueError(f"Invalid weight dtype {weight_dtype}. Choose from 'float32' or 'float16'.")
+        self.version = 0
+        # Version of the corpus the vectors were weighted against, set once they are loaded or generated
+        self.corpus_version = None
+        self.inverted_index = None
+        self.sparse_index = None
+        self.term_statistics = None
+        self.index_path = index_path
+        # Postings codec and weight quantization the index is written with, see MappedIndex.write
+        self.codec = codec
+        self.weight_bits = weight_bits
+        self.configuration = configuration if configuration is not None else IndexConfiguration()
+        # Precision of the weights of vectors built in memory, those served from the index keep its float64 weights
+        self.weight_dtype = weight_dtype
+        # Combinations whose weights are built, and the seconds each took to build
+        self.built: set[Tuple[str, str]] = set()
+        self.build_seconds: Dict[Tuple[str, str], float] = {}
+        # Weights of combinations built on demand while the rest are served from the mapped index
+        self.built_weights: Dict[Tuple[str, str], WeightArrays] = {}
+        self.corpus = None
+        self.mapped_index = MappedIndex.open_if_exists(index_path)
+        self.need_vector_generation = self.mapped_index is None
+        self.document_vectors = np.empty(0, dtype=object)
+
+    def load(self, corpus):
+        """
+        Serves the vectors from the mapped index if it was written for this corpus with every combination the
+        configuration builds eagerly, otherwise generates them and writes a new index.
+        """
+        if (self.mapped_index is not None and self.mapped_index.matches(corpus)
+                and (self.mapped_index.toc["codec"], self.mapped_index.weight_bits) == (self.codec, self.weight_bits)
+                and set(self.configuration.eager) <= self.mapped_index.combinations):
+            self.built_weights = {}
+            self.document_vectors = MappedVectors(self.mapped_index, corpus, self.built_weights)
+            self.term_statistics = None
+            self.built = set(self.mapped_index.combinations)
+            self.corpus = corpus
+            self.need_vector_generation = False
+            self.inverted_index = None
+            self.sparse_index = None
+            self.corpus_version = corpus.version
+            self.version += 1
+        else:
+            self.generate_vectors(corpus)
 
     def generate_vectors(self, corpus):
         """
         Generates vectors for a given document and stores them in the document_vectors dictionary.
         """
+        from utils.NormalisationCache import NormalisationCache
+        self._build_vectors(corpus)
+        MappedIndex.write(self.index_path, corpus, self.term_statistics, self.codec, self.weight_bits,
+                          combinations=list(self.configuration.eager))
+        NormalisationCache.get_instance().save()
+
+    def refresh(self, corpus) -> bool:
+        """
+        Reweighs every document if the corpus has changed since the vectors were built. Added, updated and deleted
+        documents shift the document frequencies and average length, so this is deferred until the next query
+        rather than done per change. Returns whether anything was rebuilt.
+        """
+        if self.corpus_version == corpus.version:
+            return False
+        self._build_vectors(corpus)
+        return True
+
+    def _build_vectors(self, corpus):
+        from vec.TermStatistics import TermStatistics
+        from vec.Vector import DocumentVector
+        # Each scheme is weighed for the whole corpus at once from the columnar statistics, then split by document
+        term_statistics = TermStatistics(corpus)
+        weights = {}
+        for vec_type, word_type in self.configuration.eager:
+            started = time.perf_counter()
+            weights[(vec_type, word_type)] = self._weigh(term_statistics, vec_type, word_type)
+            self.build_seconds[(vec_type, word_type)] = time.perf_counter() - started
+
+        # Deleted documents keep an empty slot so ids still index the array. Every vector type gets a vector, holding
+        # only the word types the configuration builds, the others are set on it when they are built
+        self.document_vectors = np.empty(len(corpus.documents), dtype=object)
+        for document in corpus.live_documents():
+            doc_id = document.metadata.doc_id
+            vector_store = VectorStore(*[DocumentVector(document.metadata) for _ in VEC_TYPES])
+            for (vec_type, word_type), arrays in weights.items():
+                vector_store.__getattribute__(vec_type).set_weights(
+                    word_type, term_weights(arrays, doc_id, corpus.vector_space, word_type))
+            self.document_vectors.put(doc_id, vector_store)
+
+        # The mapped index no longer holds these weights
+        self.mapped_index = None
+        self.built = set(weights)
+        self.built_weights = {}
+        self.corpus = corpus
+        self.need_vector_generation = False
+        self.inverted_index = None
+        self.sparse_index = None
+        self.term_statistics = term_statistics
+        self.corpus_version = corpus.version
+        self.version += 1
+
+    def materialize(self, vec_type: str, word_type: str) -> bool:
+        """
+        Builds a combination the configuration left out, the first time it is queried, and adds it to any index
+        already built. Returns whether it had to be built.
+        """
+        if (vec_type, word_type) in self.built:
+            return False
+        if vec_type not in VEC_TYPES or word_type not in WORD_TYPES:
+            raise ValueError(f"Invalid vector type {vec_type} or word type {word_type}")
+        started = time.perf_counter()
+        weights = self._weigh(self.get_term_statistics(self.corpus), vec_type, word_type)
+        if isinstance(self.document_vectors, MappedVectors):
+            self.built_weights[(vec_type, word_type)] = weights
+        else:
+            for doc_id, vector_store in enumerate(self.document_vectors):
+                if vector_store is not None:
+                    vector_store.__getattribute__(vec_type).set_weights(
+                        word_type, term_weights(weights, doc_id, self.corpus.vector_space, word_type))
+        if self.inverted_index is not None:
+            self.inverted_index.add_combination(vec_type, word_type, self._live_weights(weights, word_type))
+        self.built.add((vec_type, word_type))
+        self.build_seconds[(vec_type, word_type)] = time.perf_counter() - started
+        return True
 
-        from vec.Vector import TFIDFVector, TFIDFFieldVector, BM25plusVector, BM25plusFieldVector
-        for document in corpus.documents:
-            tfidf_vector = TFIDFVector(corpus.word_manager, document.word_manager, document.metadata,
-                                       corpus.vector_space)
-            tfidf_field_vector = TFIDFFieldVector(corpus.word_manager, document.word_manager, document.metadata,
-                                                  corpus.vector_space)
-            bm25_vec = BM25plusVector(corpus.word_manager, document.word_manager, document.metadata,
-                                      corpus.vector_space)
-            bm25_field_vec = BM25plusFieldVector(corpus.word_manager, document.word_manager, document.metadata,
-                                                 corpus.vector_space)
-            vector_store = VectorStore(tfidf_vector, tfidf_field_vector, bm25_vec, bm25_field_vec)
-            self.document_vectors.put(document.metadata.doc_id, vector_store)
+    def _weigh(self, term_statistics: "TermStatistics", vec_type: str, word_type: str) -> WeightArrays:
+        starts, terms, weights = term_statistics.document_arrays(vec_type, word_type)
+        return starts, terms.astype(np.int32), weights.astype(self.weight_dtype)
 
-        check_and_overwrite("./pklfiles/document-vectors.pkl", self.document_vectors)
+    def _live_weights(self, weights: WeightArrays, word_type: str):
+        """(document id, word weights) of every document that is not deleted"""
+        for doc_id in range(len(weights[0]) - 1):
+            live = (self.mapped_index.is_live(doc_id) if self.mapped_index is not None
+                    else self.document_vectors[doc_id] is not None)
+            if live:
+                yield doc_id, term_weights(weights, doc_id, self.corpus.vector_space, word_type).value
 
-    def gen_word_matrix(self, corpus):
-        output = {}
+    def gen_word_matrix(self, corpus) -> "WordMatrix":
+        """Lemmatized BM25+ weight of every word in every document, built from each vector's own terms"""
+        from scipy.sparse import csr_matrix
+        from search_components.WordManager import WordMatrix
+        self.materialize("BM25plusVector", "lemmatized")
+        words = list(corpus.word_manager.words["lemmatized"].keys())
+        rows = {word: index for index, word in enumerate(words)}
+        word_rows, doc_ids, values = [], [], []
+        for vectors in self.document_vectors:
+            if vectors is None:
+                continue
+            doc_id = vectors.BM25plusVector.metadata.doc_id
+            for word, word_value in vectors.BM25plusVector.lemmatized_data.value.items():
+                if word_value > 0 and word in rows:
+                    word_rows.append(rows[word])
+                    doc_ids.append(doc_id)
+                    values.append(word_value)
 
-        for word in corpus.word_manager.words["lemmatized"].keys():
-            output[word] = {}
+        matrix = csr_matrix((values, (word_rows, doc_ids)), shape=(len(words), len(self.document_vectors)))
+        return WordMatrix(words, matrix)
+
+    def get_inverted_index(self) -> "InvertedIndex":
+        """
+        Builds the term to postings index on first use so loading the stored vectors stays cheap.
+        """
+        if self.inverted_index is None:
+            from engine.InvertedIndex import InvertedIndex, MappedInvertedIndex
+            if self.mapped_index is not None:
+                self.inverted_index = MappedInvertedIndex(self.mapped_index)
+                for (vec_type, word_type), weights in self.built_weights.items():
+                    self.inverted_index.add_combination(vec_type, word_type, self._live_weights(weights, word_type))
+            else:
+                self.inverted_index = InvertedIndex(self.document_vectors, self.built)
+        return self.inverted_index
 
-            # Iterate through each document vector
-            for vectors in self.document_vectors:
-                doc_id = vectors.BM25plusVector.metadata.doc_id
-                word_value = vectors.BM25plusVector.__getattribute__(f"{"lemmatized"}_data").value.get(word, 0)
-                if word_value > 0:
-                    output[word][doc_id] = word_value
+    def get_sparse_index(self, vector_space) -> "SparseMatrixIndex":
+        """
+        Document-term matrices for the sparse scoring engine, each combination is compiled when first queried.
+        """
+        if self.sparse_index is None:
+            from engine.SparseMatrixIndex import SparseMatrixIndex
+            self.sparse_index = SparseMatrixIndex(self.document_vectors, vector_space, self.mapped_index)
+        return self.sparse_index
 
-        return output
+    def get_term_statistics(self, corpus) -> "TermStatistics":
+        """
+        Raw per field term frequencies and lengths used to reweigh documents with query time parameters.
+        """
+        if self.term_statistics is None:
+            from vec.TermStatistics import TermStatistics
+            self.term_statistics = TermStatistics(corpus)
+        return self.term_statistics
 
     def get_vector(self, doc_id) -> VectorStore:
         """
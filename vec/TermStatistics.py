@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from vec.Vector import ELEMENT_WEIGHTINGS
+
+WORD_TYPES = ["original", "stemmed", "lemmatized"]
+
+
+@dataclass(frozen=True)
+class WeightingParameters:
+    """Query time BM25 and field weighting settings, the defaults reproduce the stored vectors"""
+    k1: float = 1.2
+    b: float = 0.75
+    field_weights: Tuple[Tuple[str, float], ...] = field(default_factory=lambda: tuple(ELEMENT_WEIGHTINGS.items()))
+
+    def get_field_weight(self, tag: str) -> float:
+        return dict(self.field_weights).get(tag, 1)
+
+
+class TermFieldData:
+    """Raw per field term frequencies of one word type as flat arrays sorted by document then term"""
+
+    def __init__(self, documents: np.ndarray, terms: np.ndarray, fields: np.ndarray, counts: np.ndarray,
+                 document_frequency: np.ndarray):
+        self.documents = documents
+        self.terms = terms
+        self.fields = fields
+        self.counts = counts
+        self.document_frequency = document_frequency
+        # Start of every (document, term) run, entries for the same pair only differ by field
+        boundary = np.ones(len(documents), dtype=bool)
+        boundary[1:] = (documents[1:] != documents[:-1]) | (terms[1:] != terms[:-1])
+        self.pair_starts = np.flatnonzero(boundary)
+
+
+class TermStatistics:
+    """
+    Compact corpus statistics that let the four weighting schemes be recomputed at query time with different BM25
+    parameters or field weights, without regenerating the document vectors. Document frequencies and idfs are indexed
+    by term id, lengths by document id, and every scheme is weighed for the whole corpus in a few array passes.
+    """
+
+    def __init__(self, corpus, cache_size: int = 8):
+        word_manager = corpus.word_manager
+        self.number_of_documents = word_manager.number_of_documents
+        self.avg_doc_length = word_manager.avg_doc_length
+        self.vector_space = corpus.vector_space
+        self.field_names = sorted({tag for document in corpus.live_documents()
+                                   for tags in document.word_manager.words_by_tag.get("original", {}).values()
+                                   for tag in tags})
+        field_ids = {tag: index for index, tag in enumerate(self.field_names)}
+
+        self.doc_lengths = np.zeros(len(corpus.documents), dtype=np.float64)
+        for document in corpus.live_documents():
+            self.doc_lengths[document.metadata.doc_id] = sum(
+                sum(tag_values.values()) for tag_values in document.word_manager.words_by_tag["original"].values())
+
+        self.term_data: Dict[str, TermFieldData] = {}
+        # Idf of every term id for the TF-IDF and BM25+ formulas, terms no document holds are left at 0
+        self.tfidf_idf: Dict[str, np.ndarray] = {}
+        self.bm25_idf: Dict[str, np.ndarray] = {}
+        for word_type in WORD_TYPES:
+            self.term_data[word_type] = self._build_term_data(corpus, word_type, field_ids)
+            df = self.term_data[word_type].document_frequency.astype(np.float64)
+            held = df > 0
+            self.tfidf_idf[word_type] = np.zeros(len(df))
+            self.tfidf_idf[word_type][held] = np.log(self.number_of_documents / df[held] + 1) + 1
+            self.bm25_idf[word_type] = np.zeros(len(df))
+            self.bm25_idf[word_type][held] = np.log((self.number_of_documents - df[held] + 0.5) / (df[held] + 0.5) + 1)
+
+        self.cache_size = cache_size
+        self.matrices: OrderedDict[tuple, csr_matrix] = OrderedDict()
+
+    def _build_term_data(self, corpus, word_type: str, field_ids: Dict[str, int]) -> TermFieldData:
+        term_ids = self.vector_space.get_term_ids(word_type)
+        documents, terms, fields, counts = [], [], [], []
+        for document in sorted(corpus.live_documents(), key=lambda document: document.metadata.doc_id):
+            doc_id = document.metadata.doc_id
+            tags_by_word = document.word_manager.words_by_tag.get(word_type, {})
+            # Only words in the vector space are weighted, as with the vector intersection
+            for term_id, word in sorted((term_ids[word], word) for word in tags_by_word if word in term_ids):
+                for tag, count in tags_by_word[word].items():
+                    documents.append(doc_id)
+                    terms.append(term_id)
+                    fields.append(field_ids[tag])
+                    counts.append(count)
+
+        document_frequency = np.zeros(len(term_ids), dtype=np.int32)
+        for word, frequency in corpus.word_manager.count[word_type].items():
+            if word in term_ids:
+                document_frequency[term_ids[word]] = frequency
+        return TermFieldData(np.array(documents, dtype=np.int32), np.array(terms, dtype=np.int32),
+                             np.array(fields, dtype=np.int16), np.array(counts, dtype=np.int32), document_frequency)
+
+    def weight_matrix(self, vec_type: str, word_type: str, parameters: WeightingParameters = None) -> csr_matrix:
+        """Unit normalised document-term weights for a scheme, recently used parameter sets are kept"""
+        if parameters is None:
+            parameters = WeightingParameters()
+        key = (vec_type, word_type, parameters)
+        if key in self.matrices:
+            self.matrices.move_to_end(key)
+            return self.matrices[key]
+
+        matrix = self._weigh(vec_type, word_type, parameters)
+        self.matrices[key] = matrix
+        if len(self.matrices) > self.cache_size:
+            self.matrices.popitem(last=False)
+        return matrix
+
+    def document_weights(self, vec_type: str, word_type: str,
+                         parameters: WeightingParameters = None) -> List[Dict[str, float]]:
+        """Unit normalised word to weight dictionary of every document, indexed by document id"""
+        starts, terms, weights = self.document_arrays(vec_type, word_type, parameters)
+        words = [str(word) for word in self.vector_space.__getattribute__(f"{word_type}_vectorspace")]
+        terms, weights = terms.tolist(), weights.tolist()
+        return [{words[term]: weight for term, weight in zip(terms[start:end], weights[start:end])}
+                for start, end in zip(starts[:-1], starts[1:])]
+
+    def document_arrays(self, vec_type: str, word_type: str,
+                        parameters: WeightingParameters = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Unit normalised weights of every document as CSR style arrays: document i holds the term ids, in ascending
+        order, and weights from starts[i] to starts[i + 1]
+        """
+        if parameters is None:
+            parameters = WeightingParameters()
+        documents, terms, weights = self._weights(vec_type, word_type, parameters)
+        return np.searchsorted(documents, np.arange(len(self.doc_lengths) + 1)), terms, weights
+
+    def _weigh(self, vec_type: str, word_type: str, parameters: WeightingParameters) -> csr_matrix:
+        documents, terms, weights = self._weights(vec_type, word_type, parameters)
+        return csr_matrix((weights, (documents, terms)),
+                          shape=(len(self.doc_lengths), len(self.term_data[word_type].document_frequency)))
+
+    def _weights(self, vec_type: str, word_type: str,
+                 parameters: WeightingParameters) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(document, term, weight) of every weighted pair, sorted by document then term"""
+        data = self.term_data[word_type]
+        if vec_type in ["TFIDFFieldVector", "BM25plusFieldVector"]:
+            field_weights = np.array([parameters.get_field_weight(tag) for tag in self.field_names])
+            entry_tf = field_weights[data.fields] * data.counts
+        elif vec_type in ["TFIDFVector", "BM25plusVector"]:
+            entry_tf = data.counts.astype(np.float64)
+        else:
+            raise ValueError(f"Invalid vector type {vec_type}")
+
+        tf = np.add.reduceat(entry_tf, data.pair_starts) if len(entry_tf) else entry_tf
+        documents = data.documents[data.pair_starts]
+        terms = data.terms[data.pair_starts]
+        if np.any(data.document_frequency[terms] == 0):
+            raise ValueError("Weighted term has a document frequency of 0")
+
+        if vec_type.startswith("TFIDF"):
+            weights = np.zeros(len(tf))
+            np.log(tf, out=weights, where=tf > 0)
+            weights = np.where(tf > 0, weights + 1, 0)
+            weights *= self.tfidf_idf[word_type][terms]
+        else:
+            lengths = self.doc_lengths[documents]
+            denominator = tf + parameters.k1 * (1 - parameters.b + parameters.b * (lengths / self.avg_doc_length))
+            weights = tf * (parameters.k1 + 1) / denominator
+            weights *= self.bm25_idf[word_type][terms]
+
+        norms = np.sqrt(np.bincount(documents, weights=weights ** 2, minlength=len(self.doc_lengths)))
+        weights = np.divide(weights, norms[documents], out=np.zeros_like(weights), where=norms[documents] > 0)
+        return documents, terms, weights
@@ -1,21 +1,118 @@
 import math
 from abc import ABC, abstractmethod
-from threading import Thread
-from typing import override, Callable
+from typing import override
 
 import numpy
 
 from search_components.WordManager import WordManager, CorpusWordManager
 
+# Multipliers applied to a word's count by the tag it was found in, for the field weighted vectors
+ELEMENT_WEIGHTINGS = {
+    'metadata': 5,
+    'meta': 3,
+    'contenttitle': 3,
+    'gameBioInfoText': 5,
+    'gameBioInfo': 1,
+    'gameBioHeader': 0.5,
+    'gameBioInfoHeader': 0.5,
+    'gameBioSysReq': 3,
+    'gameBioSysReqTitle': 0.5,
+    'div': 2,
+    'i': 0.75,
+    'strong': 1.25,
+    'b': 1.25,
+    'a': 2,
+    'named entity': 3
+}
+
 
 class VectorData:
-    """Internals of a vector, the sparse vector, the intersection of words with vectorspace and word-value dictionary"""
+    """Internals of a vector, the intersection of words with vectorspace and word-value dictionary"""
 
-    def __init__(self, raw_list, intersection):
-        self.raw_list = raw_list
+    def __init__(self, intersection):
         self.intersection = intersection
         self.value = {}
 
+    def get(self, word: str, default: float = 0) -> float:
+        return self.value.get(word, default)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.intersection
+
+
+class TermWeights:
+    """
+    Weights of one word type of a document vector in two contiguous arrays, the ids of its terms in ascending order
+    and their weights. The set of matched words and the word to weight dictionary VectorData holds are derived from
+    them when asked for, so a document costs a few bytes per term rather than a set and a dictionary.
+    """
+    __slots__ = ("term_ids", "weights", "vector_space", "word_type")
+
+    def __init__(self, term_ids: numpy.ndarray, weights: numpy.ndarray, vector_space, word_type: str):
+        self.term_ids = term_ids
+        self.weights = weights
+        self.vector_space = vector_space
+        self.word_type = word_type
+
+    @property
+    def intersection(self) -> set[str]:
+        """Built from the vocabulary on every access, looking up single words with in or get is far cheaper"""
+        return set(self._words())
+
+    @property
+    def value(self) -> dict[str, float]:
+        """Built from the vocabulary on every access, take it once per document rather than once per word"""
+        return dict(zip(self._words(), self.weights.tolist()))
+
+    def get(self, word: str, default: float = 0) -> float:
+        position = self._position(word)
+        return default if position is None else float(self.weights[position])
+
+    def __contains__(self, word: str) -> bool:
+        return self._position(word) is not None
+
+    def _position(self, word: str) -> int | None:
+        """Index of a word in the arrays, found by binary search over the sorted term ids"""
+        term = self.vector_space.get_term_ids(self.word_type).get(word)
+        if term is None:
+            return None
+        position = int(numpy.searchsorted(self.term_ids, term))
+        if position < len(self.term_ids) and self.term_ids[position] == term:
+            return position
+        return None
+
+    def dot(self, other) -> float:
+        """Sum of the products of the weights of the words both hold, other may be a VectorData"""
+        if isinstance(other, TermWeights):
+            _, mine, theirs = numpy.intersect1d(self.term_ids, other.term_ids, assume_unique=True,
+                                                return_indices=True)
+            return float(numpy.dot(self.weights[mine].astype(numpy.float64), other.weights[theirs]))
+        return sum(self.get(word) * other.get(word) for word in other.intersection if word in self)
+
+    def __len__(self) -> int:
+        return len(self.term_ids)
+
+    def _words(self) -> list[str]:
+        return self.vector_space.__getattribute__(f"{self.word_type}_vectorspace")[self.term_ids].tolist()
+
+
+class DocumentVector:
+    """
+    Compact stored vector of one document for one weighting scheme, holding a TermWeights per word type in place of
+    the VectorData a Vector holds. Word types that have not been built are left unset.
+    """
+    __slots__ = ("metadata", "original_data", "stemmed_data", "lemmatized_data")
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    def set_weights(self, word_type: str, term_weights: TermWeights) -> None:
+        self.__setattr__(f"{word_type}_data", term_weights)
+
+    def dot_product(self, vec, word_type) -> float:
+        """Dot product over the words both vectors hold, as Vector.dot_product"""
+        return self.__getattribute__(f"{word_type}_data").dot(vec.__getattribute__(f"{word_type}_data"))
+
 
 class Vector(ABC):
     """Abstract base clase that handles default functionality shared across vectors shared across document vectors"""
@@ -37,11 +134,11 @@ class Vector(ABC):
         self.vec_normalise(self.original_data.value)
 
     def _process_vector_data(self, word_type) -> VectorData:
-        """Vector set up method"""
-        raw_vec = self._generate_raw_vec(self.word_manager.words[word_type],
-                                         self.vector_space.__getattribute__(f"{word_type}_vectorspace"))
-        intersection = self._getIntersection(raw_vec, self.vector_space.__getattribute__(f"{word_type}_vectorspace"))
-        vector_data = VectorData(raw_vec, intersection)
+        """Vector set up method, only the words of this document are looked up so the cost is independent of the
+        size of the vector space"""
+        intersection = self._getIntersection(self.word_manager.words[word_type],
+                                             self.vector_space.get_term_ids(word_type))
+        vector_data = VectorData(intersection)
         return vector_data
 
     def dot_product(self, vec: 'Vector', word_type) -> float:
@@ -57,22 +154,9 @@ class Vector(ABC):
 
         return dot_product
 
-    @staticmethod
-    def parallel_weighting(weighting_function: Callable, *args):
-        """Due to different NLP types this work is split among threads"""
-
-        threads = []
-        for word_type in ['lemmatized', 'stemmed', 'original']:
-            # Create a process for each word type
-            thread = Thread(target=weighting_function, args=(word_type, *args))
-            threads.append(thread)
-            thread.start()
-
-        for thread in threads:
-            thread.join()
-
     def weightingAlgorithm(self) -> None:
-        self.parallel_weighting(self._weighting_for_type)
+        for word_type in ['lemmatized', 'stemmed', 'original']:
+            self._weighting_for_type(word_type)
 
     def _weighting_for_type(self, word_type):
         data = self.__getattribute__(f"{word_type}_data")
@@ -94,18 +178,9 @@ class Vector(ABC):
         pass
 
     @staticmethod
-    def _generate_raw_vec(word_list, vector_space_type):
-        """Helper vector method"""
-        raw_vec = numpy.array([word if word_list.get(word) else 0 for word in vector_space_type])
-        return raw_vec
-
-    @staticmethod
-    def _getIntersection(raw_vec, vector_space_type):
-        """Helper vector method"""
-        vector_space_set = set(vector_space_type)
-        raw_vec_set = set(raw_vec)
-        intersection = vector_space_set.intersection(raw_vec_set)
-        return intersection
+    def _getIntersection(word_list, term_ids):
+        """Words of the document that are in the vector space"""
+        return {word for word in word_list if word in term_ids}
 
     @staticmethod
     def vec_normalise(vec):
@@ -154,24 +229,7 @@ class TFIDFFieldVector(TFIDFVector):
     def _tf(self, word_type: str, word: str, tf=None) -> float:
         """Calculates tag multiplier and passes to superclass implementation of tf"""
         tags = self.word_manager.get_tag_and_count(word_type, word)
-        element_weightings = {
-            'metadata': 5,
-            'meta': 3,
-            'contenttitle': 3,
-            'gameBioInfoText': 5,
-            'gameBioInfo': 1,
-            'gameBioHeader': 0.5,
-            'gameBioInfoHeader': 0.5,
-            'gameBioSysReq': 3,
-            'gameBioSysReqTitle': 0.5,
-            'div': 2,
-            'i': 0.75,
-            'strong': 1.25,
-            'b': 1.25,
-            'a': 2,
-            'named entity': 3
-        }
-        tag_count_multiplier = sum(element_weightings.get(tag, 1) * count for tag, count in tags)
+        tag_count_multiplier = sum(ELEMENT_WEIGHTINGS.get(tag, 1) * count for tag, count in tags)
 
         tf = super()._tf(word_type, word, tag_count_multiplier)
         return tf
@@ -180,6 +238,9 @@ class TFIDFFieldVector(TFIDFVector):
 class BM25plusVector(Vector):
     def __init__(self, corpus_word_manager: CorpusWordManager, document_word_manager: WordManager, metadata,
                  vector_space):
+        # Summed once here rather than for every term
+        self.doc_length = sum(sum(tag_values.values())
+                              for tag_values in document_word_manager.words_by_tag["original"].values())
         super().__init__(corpus_word_manager, document_word_manager, metadata, vector_space)
 
     @override
@@ -187,16 +248,13 @@ class BM25plusVector(Vector):
         if tf is None:
             tf = self.word_manager.get_word_count(word_type, word)
         numerator = tf * (1.2 + 1)
-        doc_length = sum(sum(tag_values.values()) for tag_values in self.word_manager.words_by_tag["original"].values())
-
-        denominator = tf + 1.2 * (1 - 0.75 + 0.75 * (doc_length / self.corpus_word_manager.avg_doc_length))
+        denominator = tf + 1.2 * (1 - 0.75 + 0.75 * (self.doc_length / self.corpus_word_manager.avg_doc_length))
         return numerator / denominator
 
     @override
     def _idf(self, word_type: str, word: str) -> float:
         docs_holding_word = self.corpus_word_manager.docs_holding_word[word_type].get(word, 0)
         assert (len(docs_holding_word) != 0)
-        assert (self.corpus_word_manager.number_of_documents == 399)
         numerator = self.corpus_word_manager.number_of_documents - len(docs_holding_word) + 0.5
         denominator = len(docs_holding_word) + 0.5
         idf = math.log(numerator / denominator + 1)
@@ -213,26 +271,8 @@ class BM25plusFieldVector(BM25plusVector):
     def _tf(self, word_type: str, word: str, tf=None) -> float:
         """Calculates tag multiplier and passes to superclass implementation of tf"""
         tags = self.word_manager.get_tag_and_count(word_type, word)
-        element_weightings = {
-            'metadata': 5,
-            'meta': 3,
-            'contenttitle': 3,
-            'gameBioInfoText': 5,
-            'gameBioInfo': 1,
-            'gameBioHeader': 0.5,
-            'gameBioInfoHeader': 0.5,
-            'gameBioSysReq': 3,
-            'gameBioSysReqTitle': 0.5,
-            'div': 2,
-            'i': 0.75,
-            'strong': 1.25,
-            'b': 1.25,
-            'a': 2,
-            'named entity': 3
-        }
-
         # Calculate the tag count multiplier
-        tag_count_multiplier = sum(element_weightings.get(tag, 1) * count for tag, count in tags)
+        tag_count_multiplier = sum(ELEMENT_WEIGHTINGS.get(tag, 1) * count for tag, count in tags)
 
         # Pass tf to super class implementation
         tf = super()._tf(word_type, word, tag_count_multiplier)
@@ -279,8 +319,7 @@ class QueryVector(Vector):
             total = 0
             count = 0
             for doc in relevant_doc_ids:
-                doc_data = doc.__getattribute__(f"{word_type}_data").value
-                ranking = doc_data.get(word, 0)
+                ranking = doc.__getattribute__(f"{word_type}_data").get(word, 0)
                 if ranking != 0:
                     total += ranking
                     count += 1